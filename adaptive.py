@@ -0,0 +1,63 @@
+"""Adaptive selection of neighborhood operators.
+
+Every iteration one operator is drawn with probability proportional
+to its weight. Operators are rewarded by outcome of their moves and
+every `segment` iterations weights move towards the average reward
+earned since the previous update, so operators which recently
+improved solutions are chosen more often.
+"""
+from collections import Counter
+import random
+
+BEST = 'best'
+IMPROVED = 'improved'
+ACCEPTED = 'accepted'
+REWARDS = {BEST: 5.0, IMPROVED: 2.0, ACCEPTED: 0.5}
+
+
+class OperatorSelector:
+    """
+    operators: Move kinds to choose from
+    reaction: How fast weights follow recent rewards,
+              0 - never, 1 - only last segment counts
+    segment: Iterations between weight updates
+    min_weight: Lower bound keeping every operator in play
+    rewards: Reward of each outcome (BEST, IMPROVED, ACCEPTED)
+    """
+    def __init__(self, operators, reaction=0.2, segment=20, min_weight=0.05, rewards=None):
+        self.operators = list(operators)
+        self.reaction = reaction
+        self.segment = segment
+        self.min_weight = min_weight
+        self.rewards = REWARDS if rewards is None else rewards
+        self.weights = {op: 1.0 for op in self.operators}
+        self.scores = {op: 0.0 for op in self.operators}
+        self.uses = {op: 0 for op in self.operators}
+        self.total_uses = Counter()
+        self.iteration = 0
+
+    def __repr__(self):
+        weights = ', '.join(f'{op}: {w:.2f}' for op, w in self.weights.items())
+        return f'OperatorSelector({weights})'
+
+    def choose(self):
+        """Operator drawn by roulette wheel over weights"""
+        return random.choices(self.operators, [self.weights[op] for op in self.operators])[0]
+
+    def reward(self, operator, outcome=None):
+        """Record outcome of operator's move, None - nothing accepted"""
+        self.scores[operator] += self.rewards.get(outcome, 0.0)
+        self.uses[operator] += 1
+        self.total_uses[operator] += 1
+        self.iteration += 1
+        if self.iteration % self.segment == 0:
+            self.update()
+
+    def update(self):
+        for op in self.operators:
+            if self.uses[op]:
+                average = self.scores[op] / self.uses[op]
+                weight = (1 - self.reaction) * self.weights[op] + self.reaction * average
+                self.weights[op] = max(self.min_weight, weight)
+            self.scores[op] = 0.0
+            self.uses[op] = 0
@@ -0,0 +1,278 @@
+"""Vectorized evaluation of whole neighborhoods.
+
+Neighborhood is stored in MoveBatch: operator of every move and its
+integer fields in arrays. Candidate solution is encoded as padded 2-D
+array of client ids (padding is base, which is 0 away from itself),
+so the edges around changed positions of all moves of one kind are
+gathered from distance matrix with one fancy index each. Deltas are
+the sums of moves.py in the same order, so they are bitwise equal and
+search makes exactly the same choices as with move by move evaluation.
+"""
+from itertools import chain
+from moves import OPERATORS, SWAP, RELOCATE, TWO_OPT_STAR, CROSS, swap_delta
+import numpy as np
+
+CODES = {kind: code for code, kind in enumerate(OPERATORS)}
+# Fields of a move: id_1, samp_1, id_2, samp_2, len_1, len_2 (0 when unused)
+NUM_FIELDS = 6
+
+
+def encode_solution(solution):
+    """Routes as padded 2-D array of ids and length of every route"""
+    lengths = np.fromiter(map(len, solution), dtype=np.intp, count=len(solution))
+    routes = np.zeros((len(solution), lengths.max(initial=2)), dtype=np.intp)
+    routes[np.arange(routes.shape[1]) < lengths[:, None]] = np.fromiter(
+        chain.from_iterable(solution), dtype=np.intp, count=lengths.sum())
+    return routes, lengths
+
+
+def route_prefixes(distance_matrix, routes):
+    """Cumulative distance along every encoded route, last column
+    (and every column past route end) holds cost of the route"""
+    prefix = np.zeros(routes.shape)
+    # Summed in precision of distance matrix, as cached prefixes of search
+    prefix[:, 1:] = np.cumsum(distance_matrix[routes[:, :-1], routes[:, 1:]], axis=1)
+    return prefix
+
+
+def swap_deltas(distance_matrix, routes, fields):
+    """Deltas of swaps between different routes"""
+    dm = distance_matrix
+    id_1, samp_1, id_2, samp_2 = fields[:, :4].T
+    p1, a, n1 = routes[id_1, samp_1-1], routes[id_1, samp_1], routes[id_1, samp_1+1]
+    p2, b, n2 = routes[id_2, samp_2-1], routes[id_2, samp_2], routes[id_2, samp_2+1]
+    return (dm[p1, b] + dm[b, n1] + dm[p2, a] + dm[a, n2]
+            - dm[p1, a] - dm[a, n1] - dm[p2, b] - dm[b, n2])
+
+
+def relocate_deltas(distance_matrix, routes, fields):
+    dm = distance_matrix
+    id_1, samp_1, id_2, samp_2 = fields[:, :4].T
+    p, c, n = routes[id_1, samp_1-1], routes[id_1, samp_1], routes[id_1, samp_1+1]
+    q, s = routes[id_2, samp_2-1], routes[id_2, samp_2]
+    return (dm[p, n] - dm[p, c] - dm[c, n]
+            + dm[q, c] + dm[c, s] - dm[q, s])
+
+
+def two_opt_star_deltas(distance_matrix, routes, fields):
+    dm = distance_matrix
+    id_1, samp_1, id_2, samp_2 = fields[:, :4].T
+    a, n1 = routes[id_1, samp_1], routes[id_1, samp_1+1]
+    b, n2 = routes[id_2, samp_2], routes[id_2, samp_2+1]
+    return dm[a, n2] + dm[b, n1] - dm[a, n1] - dm[b, n2]
+
+
+def _segments(routes, fields):
+    id_1, samp_1, id_2, samp_2, len_1, len_2 = fields.T
+    return (routes[id_1, samp_1-1], routes[id_1, samp_1],
+            routes[id_1, samp_1+len_1-1], routes[id_1, samp_1+len_1],
+            routes[id_2, samp_2-1], routes[id_2, samp_2],
+            routes[id_2, samp_2+len_2-1], routes[id_2, samp_2+len_2])
+
+
+def cross_deltas(distance_matrix, routes, fields):
+    dm = distance_matrix
+    p1, f1, e1, n1, p2, f2, e2, n2 = _segments(routes, fields)
+    return (dm[p1, f2] + dm[e2, n1] + dm[p2, f1] + dm[e1, n2]
+            - dm[p1, f1] - dm[e1, n1] - dm[p2, f2] - dm[e2, n2])
+
+
+def swap_route_deltas(distance_matrix, routes, prefix, fields):
+    dm = distance_matrix
+    id_1, samp_1, id_2, samp_2 = fields[:, :4].T
+    p1, a, n1 = routes[id_1, samp_1-1], routes[id_1, samp_1], routes[id_1, samp_1+1]
+    p2, b, n2 = routes[id_2, samp_2-1], routes[id_2, samp_2], routes[id_2, samp_2+1]
+    return (dm[p1, b] + dm[b, n1] - dm[p1, a] - dm[a, n1],
+            dm[p2, a] + dm[a, n2] - dm[p2, b] - dm[b, n2])
+
+
+def relocate_route_deltas(distance_matrix, routes, prefix, fields):
+    dm = distance_matrix
+    id_1, samp_1, id_2, samp_2 = fields[:, :4].T
+    p, c, n = routes[id_1, samp_1-1], routes[id_1, samp_1], routes[id_1, samp_1+1]
+    q, s = routes[id_2, samp_2-1], routes[id_2, samp_2]
+    return dm[p, n] - dm[p, c] - dm[c, n], dm[q, c] + dm[c, s] - dm[q, s]
+
+
+def two_opt_star_route_deltas(distance_matrix, routes, prefix, fields):
+    dm = distance_matrix
+    id_1, samp_1, id_2, samp_2 = fields[:, :4].T
+    c1, c2 = prefix[id_1, -1], prefix[id_2, -1]
+    tail_1, tail_2 = c1 - prefix[id_1, samp_1+1], c2 - prefix[id_2, samp_2+1]
+    new_1 = prefix[id_1, samp_1] + dm[routes[id_1, samp_1], routes[id_2, samp_2+1]] + tail_2
+    new_2 = prefix[id_2, samp_2] + dm[routes[id_2, samp_2], routes[id_1, samp_1+1]] + tail_1
+    return new_1 - c1, new_2 - c2
+
+
+def cross_route_deltas(distance_matrix, routes, prefix, fields):
+    dm = distance_matrix
+    id_1, samp_1, id_2, samp_2, len_1, len_2 = fields.T
+    p1, f1, e1, n1, p2, f2, e2, n2 = _segments(routes, fields)
+    seg_1 = prefix[id_1, samp_1+len_1-1] - prefix[id_1, samp_1]
+    seg_2 = prefix[id_2, samp_2+len_2-1] - prefix[id_2, samp_2]
+    return (dm[p1, f2] + seg_2 + dm[e2, n1] - dm[p1, f1] - seg_1 - dm[e1, n1],
+            dm[p2, f1] + seg_1 + dm[e1, n2] - dm[p2, f2] - seg_2 - dm[e2, n2])
+
+
+DELTAS = {
+    CODES[SWAP]: swap_deltas,
+    CODES[RELOCATE]: relocate_deltas,
+    CODES[TWO_OPT_STAR]: two_opt_star_deltas,
+    CODES[CROSS]: cross_deltas,
+}
+
+ROUTE_DELTAS = {
+    CODES[SWAP]: swap_route_deltas,
+    CODES[RELOCATE]: relocate_route_deltas,
+    CODES[TWO_OPT_STAR]: two_opt_star_route_deltas,
+    CODES[CROSS]: cross_route_deltas,
+}
+
+
+class MoveBatch:
+    """
+    Moves of neighborhood in arrays, in order they were generated
+    kinds: Index of operator of every move in moves.OPERATORS
+    fields: Array of rows id_1, samp_1, id_2, samp_2, len_1, len_2
+    """
+    __slots__ = ('kinds', 'fields')
+
+    def __init__(self, kinds, fields):
+        self.kinds = np.asarray(kinds, dtype=np.intp)
+        self.fields = np.asarray(fields, dtype=np.intp).reshape(-1, NUM_FIELDS)
+
+    @classmethod
+    def from_moves(cls, moves):
+        """Batch of move tuples (see moves.py)"""
+        kinds = [CODES[move[0]] for move in moves]
+        fields = [move[1:] + (0,) * (NUM_FIELDS + 1 - len(move)) for move in moves]
+        return cls(kinds, fields)
+
+    @classmethod
+    def of_kind(cls, kind, id_1, samp_1, id_2, samp_2, len_1=0, len_2=0):
+        """Batch of moves of one kind from arrays of their fields"""
+        columns = np.broadcast_arrays(id_1, samp_1, id_2, samp_2, len_1, len_2)
+        fields = np.stack(columns, axis=-1).reshape(-1, NUM_FIELDS)
+        return cls(np.full(len(fields), CODES[kind], dtype=np.intp), fields)
+
+    @classmethod
+    def concat(cls, batches):
+        return cls(np.concatenate([b.kinds for b in batches]),
+                   np.concatenate([b.fields for b in batches]))
+
+    def __repr__(self):
+        return f'MoveBatch({len(self)} moves)'
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @staticmethod
+    def _as_move(code, fields):
+        kind = OPERATORS[code]
+        return (kind,) + tuple(fields if kind == CROSS else fields[:4])
+
+    def move(self, i):
+        """Move tuple at index i"""
+        return self._as_move(self.kinds[i].item(), self.fields[i].tolist())
+
+    def moves(self):
+        """All moves as tuples"""
+        return [self._as_move(code, fields)
+                for code, fields in zip(self.kinds.tolist(), self.fields.tolist())]
+
+    def keys(self, solution, indices=None):
+        """Tabu keys (moves.move_key) of moves at indices, all by default"""
+        indices = np.arange(len(self)) if indices is None else np.asarray(indices, dtype=np.intp)
+        routes, _ = encode_solution(solution)
+        id_1, samp_1, id_2, samp_2, len_1, len_2 = self.fields[indices].T
+        a, b = routes[id_1, samp_1], routes[id_2, samp_2]
+        clients = a.tolist()
+        low, high = np.minimum(id_1, id_2).tolist(), np.maximum(id_1, id_2).tolist()
+        first, second = np.minimum(a, b).tolist(), np.maximum(a, b).tolist()
+        # Segments of CROSS are ordered by first client, then by length
+        swapped = (a > b) | ((a == b) & (len_1 > len_2))
+        seg_1 = np.where(swapped, b, a).tolist(), np.where(swapped, len_2, len_1).tolist()
+        seg_2 = np.where(swapped, a, b).tolist(), np.where(swapped, len_1, len_2).tolist()
+        keys = []
+        for j, code in enumerate(self.kinds[indices].tolist()):
+            kind = OPERATORS[code]
+            if kind == RELOCATE:
+                keys.append((kind, clients[j], low[j], high[j]))
+            elif kind == CROSS:
+                keys.append((kind, seg_1[0][j], seg_1[1][j], seg_2[0][j], seg_2[1][j],
+                             low[j], high[j]))
+            else:
+                keys.append((kind, first[j], second[j], low[j], high[j]))
+        return keys
+
+    def _groups(self):
+        """Indices of moves of each kind (slice when all are one kind)"""
+        codes = np.unique(self.kinds).tolist()
+        if len(codes) == 1:
+            return [(codes[0], slice(None))]
+        return [(code, np.flatnonzero(self.kinds == code)) for code in codes]
+
+    def _same_route(self):
+        """Indices of swaps inside one route, evaluated move by move"""
+        id_1, id_2 = self.fields[:, 0], self.fields[:, 2]
+        return np.flatnonzero(id_1 == id_2)
+
+    def deltas(self, distance_matrix, solution, routes):
+        """Cost change of every move
+        routes: Solution encoded by encode_solution"""
+        deltas = np.empty(len(self), dtype=distance_matrix.dtype)
+        for code, idx in self._groups():
+            deltas[idx] = DELTAS[code](distance_matrix, routes, self.fields[idx])
+        for i in self._same_route():
+            deltas[i] = swap_delta(distance_matrix, solution, self.move(i))
+        return deltas
+
+    def route_deltas(self, distance_matrix, solution, routes, prefix):
+        """Cost change of both routes of every move, second
+        is 0 for swaps inside one route
+        prefix: Cumulative distances, see route_prefixes"""
+        deltas_1 = np.empty(len(self), dtype=distance_matrix.dtype)
+        deltas_2 = np.empty(len(self), dtype=distance_matrix.dtype)
+        for code, idx in self._groups():
+            deltas_1[idx], deltas_2[idx] = ROUTE_DELTAS[code](distance_matrix, routes, prefix,
+                                                              self.fields[idx])
+        for i in self._same_route():
+            deltas_1[i] = swap_delta(distance_matrix, solution, self.move(i))
+            deltas_2[i] = 0.0
+        return deltas_1, deltas_2
+
+    def loads(self, lengths):
+        """Number of clients in both routes of every move after it is applied"""
+        id_1, samp_1, id_2, samp_2, len_1, len_2 = self.fields.T
+        n1, n2 = lengths[id_1] - 2, lengths[id_2] - 2
+        kinds = self.kinds
+        relocate = kinds == CODES[RELOCATE]
+        two_opt_star = kinds == CODES[TWO_OPT_STAR]
+        # len_1 and len_2 are 0 for all moves but CROSS
+        load_1 = np.where(two_opt_star, samp_1 + n2 - samp_2, n1 - len_1 + len_2 - relocate)
+        load_2 = np.where(two_opt_star, samp_2 + n1 - samp_1, n2 - len_2 + len_1 + relocate)
+        return load_1, load_2
+
+
+def select_move(scores, deltas, base_cost, best_cost, is_tabu):
+    """Index of winning move, None when every move is tabu and none
+    aspires. Same choice as scanning moves in order: start from the
+    first non-tabu move, take every later move with strictly lower
+    score which is not tabu or leads below best_cost (aspiration),
+    but tabu state is checked only for the few moves which can win
+    is_tabu: Function of move index"""
+    n = len(scores)
+    first = next((i for i in range(n) if not is_tabu(i)), None)
+    aspiration = base_cost + deltas < best_cost
+    if first is None:
+        # Every move is tabu, lowest score among aspiring ones wins
+        candidates = np.flatnonzero(aspiration[1:]) + 1
+        if not len(candidates):
+            return None
+        return candidates[np.argmin(scores[candidates])].item()
+    candidates = np.flatnonzero(scores[1:] < scores[first]) + 1
+    # Stable sort keeps earlier move first among equal scores
+    for i in candidates[np.argsort(scores[candidates], kind='stable')].tolist():
+        if aspiration[i] or not is_tabu(i):
+            return i
+    return first
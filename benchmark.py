@@ -0,0 +1,192 @@
+"""Benchmark of TabuSearch scaling on generated instances.
+
+Times distance matrix build, neighborhood generation, fitness
+evaluation (move by move and vectorized) and full search for every instance kind and size,
+records solution quality over iterations and writes results
+to JSON or CSV file (chosen by extension).
+
+    python benchmark.py --sizes 10 100 1000 --output bench.json
+    python benchmark.py --output new.json --compare bench.json
+"""
+from batch import MoveBatch
+from client import Client
+from distances import build_distance_matrix
+from instances import GENERATORS, generate_clients
+from moves import OPERATORS, move_delta
+from store import ClientStore
+from tabu_search import TabuSearch
+from time import perf_counter
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import numpy as np
+
+SIZES = [10, 100, 1000, 10000]
+METRICS = ['distance_matrix', 'neighborhood_time', 'move_delta', 'fitness', 'search', 'best_cost']
+
+
+def _timed(func, repeats=1):
+    """Mean wall time of func in seconds and its last result"""
+    start = perf_counter()
+    for _ in range(repeats):
+        result = func()
+    return (perf_counter() - start) / repeats, result
+
+
+def _version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_instance(kind, size, seed, capacity, n_iters, tabu_size, neighborhood, repeats=5,
+                   operators=None):
+    """Benchmark one generated instance, returns result record"""
+    clients = ClientStore.from_array(generate_clients(size, kind, seed))
+    coords = clients.coords(Client(0, 0, 0))
+    matrix_time, distance_matrix = _timed(lambda: build_distance_matrix(coords), repeats)
+    # One drone per route
+    num_of_drones = -(-size // capacity)
+    ts = TabuSearch(num_of_drones, capacity, size, clients=clients, distance_matrix=distance_matrix)
+
+    random.seed(seed)
+    np.random.seed(seed)
+    ts.initialize_solution(ts.generate_random_solution())
+    if neighborhood == 'granular':
+        find_moves = ts.find_granular_moves
+    else:
+        find_moves = ts.find_moves
+    neighborhood_time, moves = _timed(find_moves, repeats)
+    delta_time, _ = _timed(lambda: [move_delta(ts.distance_matrix, ts.best_candidate, m)
+                                    for m in moves], repeats)
+    batch = MoveBatch.from_moves(moves)
+    batch_time, _ = _timed(lambda: ts.batch_deltas(batch), repeats)
+    fitness_time, _ = _timed(lambda: ts._fitness(ts.best_candidate), repeats)
+
+    random.seed(seed)
+    np.random.seed(seed)
+    ts = TabuSearch(num_of_drones, capacity, size, clients=clients, distance_matrix=distance_matrix)
+    with contextlib.redirect_stdout(io.StringIO()):
+        search_time, _ = _timed(lambda: ts.search(tabu_size, n_iters, neighborhood=neighborhood,
+                                                  operators=operators))
+
+    checkpoints = sorted({min(i * max(n_iters // 10, 1), n_iters) for i in range(11)})
+    return {
+        'kind': kind,
+        'size': size,
+        'seed': seed,
+        'capacity': capacity,
+        'routes': ts.D,
+        'n_iters': n_iters,
+        'neighborhood': neighborhood,
+        'operators': ' '.join(operators) if operators else 'default',
+        'moves': len(moves),
+        'distance_matrix': matrix_time,
+        'neighborhood_time': neighborhood_time,
+        'move_delta': delta_time / max(len(moves), 1),
+        'batch_delta': batch_time / max(len(moves), 1),
+        'fitness': fitness_time,
+        'search': search_time,
+        'iterations_per_second': n_iters / search_time if search_time else None,
+        'initial_cost': float(ts.best_costs[0]),
+        'best_cost': float(ts.best_cost),
+        'best_costs': {str(i): float(ts.best_costs[i]) for i in checkpoints},
+    }
+
+
+def run(sizes, kinds, seed, capacity, n_iters, tabu_size, neighborhood, operators=None):
+    results = []
+    for kind in kinds:
+        for size in sizes:
+            record = bench_instance(kind, size, seed, capacity, n_iters, tabu_size, neighborhood,
+                                    operators=operators)
+            print(f"{kind:>10} {size:>6}: matrix {record['distance_matrix']:.4f}s  "
+                  f"search {record['search']:.3f}s  best cost {record['best_cost']:.1f}")
+            results.append(record)
+    return {
+        'version': _version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': results,
+    }
+
+
+def save(report, file_name):
+    if os.path.splitext(file_name)[1].lower() == '.csv':
+        rows = [{k: v for k, v in r.items() if k != 'best_costs'} for r in report['results']]
+        with open(file_name, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['version'] + list(rows[0]))
+            writer.writeheader()
+            writer.writerows({'version': report['version'], **r} for r in rows)
+    else:
+        with open(file_name, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+def load(file_name):
+    if os.path.splitext(file_name)[1].lower() == '.csv':
+        with open(file_name, newline='') as file:
+            rows = list(csv.DictReader(file))
+        for row in rows:
+            for key in METRICS:
+                row[key] = float(row[key])
+        return {'version': rows[0]['version'] if rows else 'unknown', 'results': rows}
+    with open(file_name) as file:
+        return json.load(file)
+
+
+def compare(report, baseline, tolerance):
+    """Print ratios against baseline, returns number of regressions:
+    timings slower or costs worse by more than tolerance"""
+    old = {(r['kind'], int(r['size'])): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nCompared to {baseline['version']} (ratio new/old):")
+    for r in report['results']:
+        key = (r['kind'], int(r['size']))
+        if key not in old:
+            continue
+        ratios = {m: r[m] / old[key][m] for m in METRICS if old[key][m]}
+        worse = [m for m, ratio in ratios.items() if ratio > 1 + tolerance]
+        regressions += len(worse)
+        print(f'{key[0]:>10} {key[1]:>6}: '
+              + '  '.join(f'{m} {ratio:.2f}' + ('!' if m in worse else '') for m, ratio in ratios.items()))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--kinds', nargs='+', default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--capacity', type=int, default=8)
+    parser.add_argument('--iters', type=int, default=100)
+    parser.add_argument('--tabu-size', type=int, default=50)
+    parser.add_argument('--neighborhood', default='granular', choices=['random', 'granular'])
+    parser.add_argument('--operators', nargs='+', choices=OPERATORS,
+                        help='Move kinds chosen adaptively (default: swap and relocate)')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='Baseline results file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown before reporting regression')
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.kinds, args.seed, args.capacity,
+                 args.iters, args.tabu_size, args.neighborhood, args.operators)
+    save(report, args.output)
+    if args.compare:
+        return 1 if compare(report, load(args.compare), args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Compact binary snapshots of search state and solutions.
+
+Checkpoints hold everything needed to continue interrupted search
+exactly (see TabuSearch.from_checkpoint): clients, routes as flat int
+arrays with offsets, tabu entries encoded as int rows, states of both
+random generators, cost history, fleet schedule and state of adaptive
+operator selection. Distance matrix is rebuilt from clients on load.
+
+Exported solutions (export_solution) hold clients, routes and path of
+every drone, load_solution returns object which WithVisualization and
+EventSimulator.from_search accept in place of TabuSearch.
+"""
+from itertools import chain
+from client import Client
+from distances import build_distance_matrix
+from moves import OPERATORS
+from store import ClientStore, FleetStore
+import json
+import os
+import random
+import numpy as np
+
+# Longest tabu key: (CROSS, a, len_a, b, len_b, id_1, id_2)
+KEY_WIDTH = 7
+
+
+def flatten_routes(routes):
+    """Routes as flat array of ids and offsets of every route"""
+    offsets = np.cumsum([0] + [len(r) for r in routes], dtype=np.int64)
+    flat = np.fromiter(chain.from_iterable(routes), dtype=np.int32, count=offsets[-1])
+    return flat, offsets
+
+
+def unflatten_routes(flat, offsets):
+    flat = flat.tolist()
+    offsets = offsets.tolist()
+    return [flat[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def encode_keys(keys):
+    """Tabu keys as int rows: operator index, then key fields,
+    padded with -1 (key fields are never negative)"""
+    rows = np.full((len(keys), KEY_WIDTH), -1, dtype=np.int64)
+    for row, key in zip(rows, keys):
+        row[0] = OPERATORS.index(key[0])
+        row[1:len(key)] = key[1:]
+    return rows
+
+
+def decode_keys(rows):
+    return [(OPERATORS[row[0]],) + tuple(v for v in row[1:] if v >= 0) for row in rows.tolist()]
+
+
+def _client_rows(clients):
+    return np.column_stack((clients.ids, clients.x, clients.y))
+
+
+def _write_npz(file_name, arrays):
+    # Write to temporary file first so an interrupted save keeps previous file
+    tmp_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(tmp_name, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(tmp_name, file_name)
+
+
+def save_checkpoint(ts, file_name, state=None):
+    """Save search state of ts to npz file
+    state: JSON-serializable state of search loop (iteration, parameters)"""
+    version, random_state, gauss = random.getstate()
+    _, np_keys, np_pos, np_has_gauss, np_gauss = np.random.get_state()
+    tabu = ts.TABU
+    meta = {
+        'M': ts.M, 'Q': ts.Q, 'N': ts.N, 'D': ts.D,
+        'dtype': np.dtype(ts.distance_matrix.dtype).name,
+        'stop_time': ts.stop_time,
+        'makespan_weight': ts.makespan_weight,
+        'best_cost': float(ts.best_cost),
+        'candidate_is_best': ts.best_candidate is ts.best_solution,
+        'tabu': {'iteration': tabu.iteration, 'tenure': tabu.tenure,
+                 'frequency': tabu.frequency is not None},
+        'random': {'version': version, 'gauss': gauss},
+        'np_random': {'pos': int(np_pos), 'has_gauss': int(np_has_gauss), 'gauss': float(np_gauss)},
+        'state': state or {},
+    }
+    solution, solution_offsets = flatten_routes(ts.best_solution)
+    arrays = {
+        'clients': _client_rows(ts.clients),
+        'solution': solution,
+        'solution_offsets': solution_offsets,
+        'tabu_keys': encode_keys(list(tabu.expiry)),
+        'tabu_expiry': np.fromiter(tabu.expiry.values(), dtype=np.int64, count=len(tabu.expiry)),
+        # Saved rather than recomputed, sums over prefixes differ in last bits
+        'route_costs': np.asarray(ts.route_costs, dtype=np.float64),
+        'costs': np.asarray(ts.costs, dtype=np.float64),
+        'best_costs': np.asarray(ts.best_costs, dtype=np.float64),
+        'random_state': np.asarray(random_state, dtype=np.int64),
+        'np_random_keys': np_keys,
+    }
+    if not meta['candidate_is_best']:
+        arrays['candidate'], arrays['candidate_offsets'] = flatten_routes(ts.best_candidate)
+    if tabu.frequency is not None:
+        arrays['frequency_keys'] = encode_keys(list(tabu.frequency))
+        arrays['frequency_counts'] = np.fromiter(tabu.frequency.values(), dtype=np.int64,
+                                                 count=len(tabu.frequency))
+    if ts.schedule is not None:
+        meta['schedule_updates'] = ts.schedule.updates
+        arrays['schedule_assignment'] = np.asarray(ts.schedule.assignment, dtype=np.int64)
+        arrays['schedule_loads'] = np.asarray(ts.schedule.loads, dtype=np.float64)
+    if ts.best_assignment is not None and ts.best_assignment[0] is ts.best_solution:
+        arrays['best_assignment'] = np.asarray(ts.best_assignment[1], dtype=np.int64)
+    selector = ts.selector
+    if selector is not None:
+        ops = selector.operators
+        meta['selector'] = {'operators': ops, 'reaction': selector.reaction,
+                            'segment': selector.segment, 'min_weight': selector.min_weight,
+                            'rewards': selector.rewards, 'iteration': selector.iteration}
+        arrays['selector_weights'] = np.array([selector.weights[op] for op in ops])
+        arrays['selector_scores'] = np.array([selector.scores[op] for op in ops])
+        arrays['selector_uses'] = np.array([selector.uses[op] for op in ops], dtype=np.int64)
+        arrays['selector_total_uses'] = np.array([selector.total_uses[op] for op in ops],
+                                                 dtype=np.int64)
+    # Client ids in routes and keys can be numpy integers
+    arrays['meta'] = np.array(json.dumps(meta, default=int))
+    _write_npz(file_name, arrays)
+
+
+def read_checkpoint(file_name):
+    """Decoded content of checkpoint: meta dict, clients rows,
+    routes and tabu entries as lists, other arrays unchanged"""
+    with np.load(file_name, allow_pickle=False) as data:
+        data = dict(data)
+    meta = json.loads(data.pop('meta').item())
+    data['meta'] = meta
+    data['solution'] = unflatten_routes(data['solution'], data.pop('solution_offsets'))
+    if 'candidate' in data:
+        data['candidate'] = unflatten_routes(data['candidate'], data.pop('candidate_offsets'))
+    data['tabu'] = dict(zip(decode_keys(data.pop('tabu_keys')), data.pop('tabu_expiry').tolist()))
+    if 'frequency_keys' in data:
+        data['frequency'] = dict(zip(decode_keys(data.pop('frequency_keys')),
+                                     data.pop('frequency_counts').tolist()))
+    data['random_state'] = (meta['random']['version'],
+                            tuple(data['random_state'].tolist()), meta['random']['gauss'])
+    data['np_random_state'] = ('MT19937', data.pop('np_random_keys'), meta['np_random']['pos'],
+                               meta['np_random']['has_gauss'], meta['np_random']['gauss'])
+    return data
+
+
+def export_solution(ts, file_name):
+    """Save best solution with path of every drone to npz file"""
+    if not ts.processed_solution:
+        ts.process_solution()
+    routes, route_offsets = flatten_routes(ts.best_solution)
+    paths, path_offsets = flatten_routes([[p.id for p in path]
+                                          for path in ts.processed_solution.values()])
+    _write_npz(file_name, {
+        'clients': _client_rows(ts.clients),
+        'routes': routes,
+        'route_offsets': route_offsets,
+        'paths': paths,
+        'path_offsets': path_offsets,
+        'capacity': np.array([d.capacity for d in ts.processed_solution], dtype=np.int64),
+        'best_cost': np.array(float(ts.best_cost)),
+    })
+
+
+class SavedSolution:
+    """
+    Solution loaded from file, usable in place of TabuSearch
+    by WithVisualization and EventSimulator.from_search
+    best_solution: Routes of solution
+    processed_solution: Path of every drone (drone -> points)
+    distance_matrix: Built from clients when first used
+    """
+    def __init__(self, clients, routes, paths, capacity, best_cost):
+        self.BASE = Client(0, 0, 0)
+        self.clients = clients
+        self.best_solution = routes
+        self.best_cost = best_cost
+        self.drones = FleetStore(len(paths), 0)
+        self.drones.capacity[:] = capacity
+        self.processed_solution = {
+            drone: [self.BASE if c == 0 else clients[c-1] for c in path]
+            for drone, path in zip(self.drones, paths)
+        }
+        self._distance_matrix = None
+
+    def __repr__(self):
+        return f'SavedSolution({len(self.clients)} clients, {len(self.drones)} drones, cost: {self.best_cost:.2f})'
+
+    @property
+    def distance_matrix(self):
+        if self._distance_matrix is None:
+            self._distance_matrix = build_distance_matrix(self.clients.coords(self.BASE))
+        return self._distance_matrix
+
+
+def load_solution(file_name):
+    with np.load(file_name, allow_pickle=False) as data:
+        return SavedSolution(ClientStore.from_array(data['clients']),
+                             unflatten_routes(data['routes'], data['route_offsets']),
+                             unflatten_routes(data['paths'], data['path_offsets']),
+                             data['capacity'], data['best_cost'].item())
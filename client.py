@@ -5,6 +5,8 @@ class Client:
     id: Identifier
     x, y: Coordinates
     """
+    __slots__ = ('id', 'x', 'y')
+
     def __init__(self, id, x, y):
         self.id = id
         self.x, self.y = x, y
@@ -0,0 +1,124 @@
+"""Buffered structured log of drone events.
+
+Records are kept in memory and written as JSON lines by a background
+thread, so logging an event never opens or writes the file itself.
+"""
+from simulation import Event, format_event
+import atexit
+import json
+import queue
+import threading
+
+LOG_FILE = 'logs.jsonl'
+
+
+class DeliveryLog:
+    """
+    file_name: JSON lines file records are appended to
+    echo: Print human readable line of each record to stdout
+    batch_size: Number of buffered records handed to writer at once
+    flush_interval: Max seconds a record waits in buffer
+    """
+    def __init__(self, file_name=LOG_FILE, echo=True, batch_size=1000, flush_interval=0.5):
+        self.file_name = file_name
+        self.echo = echo
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._batches = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_batches, daemon=True)
+        self._writer.start()
+
+    def __repr__(self):
+        return f'DeliveryLog({self.file_name})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def log(self, event):
+        """Add Event record to buffer"""
+        if self.echo:
+            print(format_event(event))
+        with self._lock:
+            self._buffer.append(event)
+            if len(self._buffer) >= self.batch_size:
+                self._queue_buffer()
+
+    def _queue_buffer(self):
+        """Hand buffered records to writer, caller holds the lock so
+        flush never sees records which are neither buffered nor queued"""
+        if self._buffer:
+            self._batches.put(self._buffer)
+            self._buffer = []
+
+    def _write_batches(self):
+        while True:
+            try:
+                batch = self._batches.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Pass pending records through queue, so flush can wait for them
+                with self._lock:
+                    self._queue_buffer()
+                continue
+            if batch is None:
+                self._batches.task_done()
+                return
+            self._write(batch)
+            self._batches.task_done()
+
+    def _write(self, batch):
+        with open(self.file_name, 'a') as file:
+            file.writelines(json.dumps(e._asdict()) + '\n' for e in batch)
+
+    def flush(self):
+        """Block until all buffered records are written"""
+        with self._lock:
+            self._queue_buffer()
+        self._batches.join()
+
+    def close(self):
+        """Flush records and stop writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._batches.put(None)
+        self._writer.join()
+
+    def clear(self):
+        """Remove all records written so far"""
+        self.flush()
+        open(self.file_name, 'w').close()
+
+
+def read_log(file_name=LOG_FILE):
+    """Load records of a run as list of Events"""
+    with open(file_name) as file:
+        return [Event(**json.loads(line)) for line in file if line.strip()]
+
+
+_current_log = None
+
+
+def get_log():
+    """Log used by drones, created on first use"""
+    global _current_log
+    if _current_log is None:
+        _current_log = DeliveryLog()
+        atexit.register(_current_log.close)
+    return _current_log
+
+
+def set_log(log):
+    """Replace log used by drones, previous one is closed"""
+    global _current_log
+    if _current_log is not None and _current_log is not log:
+        _current_log.close()
+    _current_log = log
+    if log is not None:
+        atexit.register(log.close)
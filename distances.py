@@ -0,0 +1,40 @@
+import hashlib
+import os
+import numpy as np
+
+
+def build_distance_matrix(coords, dtype=np.float64):
+    """Euclidian distance matrix of all points in one vectorized step
+    coords: array of shape (N, 2) with base as the first row"""
+    coords = np.asarray(coords)
+    x = coords[:, 0].astype(dtype)
+    y = coords[:, 1].astype(dtype)
+    dx = np.subtract.outer(x, x)
+    dy = np.subtract.outer(y, y)
+    return np.hypot(dx, dy, out=dx)
+
+
+def file_digest(file_name, chunk_size=1 << 20):
+    """SHA-1 of file content, read in chunks"""
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_distance_matrix(file_name, coords, dtype=np.float64, cache_dir='.cache'):
+    """Load distance matrix memory-mapped from cache_dir or build and store it.
+    Cache key: hash of clients file, number of points and dtype"""
+    key = f'{file_digest(file_name)}_{len(coords)}_{np.dtype(dtype).name}'
+    path = os.path.join(cache_dir, f'distances_{key}.npy')
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+    distance_matrix = build_distance_matrix(coords, dtype)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to temporary file first so readers never see partial matrix
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.save(file, distance_matrix)
+    os.replace(tmp_path, path)
+    return distance_matrix
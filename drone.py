@@ -1,3 +1,5 @@
+from delivery_log import get_log
+from simulation import Event, BASE_EVENT, DELIVERY_EVENT
 import numpy as np
 
 class Drone:
@@ -9,6 +11,9 @@ class Drone:
     temp_client_id: Assigned client's id
     x_client, y_client: Coords of assigned client
     """
+    __slots__ = ('id', 'capacity', 'num_of_packages', 'temp_client_id',
+                 'x', 'y', 'x_client', 'y_client', 'x_prev_client', 'y_prev_client')
+
     def __init__(self, id, capacity):
         self.id = id
         self.capacity = capacity
@@ -25,11 +30,9 @@ class Drone:
         """Change drone position"""
         self.x, self.y = x, y
     
-    def create_log(self, log):
-        """Print log and save to file"""
-        print(log)
-        with open("logs.txt", "a") as file_object:
-            file_object.write(log + "\n")
+    def create_log(self, elapsed_time, kind, client_id=0):
+        """Add event record to delivery log (see delivery_log)"""
+        get_log().log(Event(elapsed_time, self.id, self.num_of_packages, client_id, kind))
 
     def get_distance_from_client(self):
         """Euclidian distance from client"""
@@ -41,7 +44,7 @@ class Drone:
         self.num_of_packages -= 1
         self.x_prev_client = self.x_client
         self.y_prev_client = self.y_client
-        self.create_log(f"Time: {elapsed_time} min  (Drone: {self.id} | Packages: {self.num_of_packages}) - Package delivered to client with id {self.temp_client_id}")
+        self.create_log(elapsed_time, DELIVERY_EVENT, self.temp_client_id)
         if self.num_of_packages == 0:
             self.x_client = 0
             self.y_client = 0
@@ -71,7 +74,7 @@ class Drone:
             if distance <= 1:
                 if self.x_client == 0 and self.y_client == 0:
                     self.load_packages()
-                    self.create_log(f"Time: {elapsed_time} min  (Drone: {self.id} | Packages: {self.num_of_packages}) - In base")
+                    self.create_log(elapsed_time, BASE_EVENT)
                     self.change_position(0, 0)
                 else:
                     self.deliver_package(elapsed_time)
@@ -0,0 +1,123 @@
+"""Reading and writing client instance files.
+
+Text files have one client per line: id,x,y
+Binary files keep the same rows as an integer array of shape (N, 3):
+.npy is memory-mapped (no copy), .npz stores it under key 'clients'.
+"""
+from store import ClientStore
+import numpy as np
+import os
+import warnings
+
+CHUNK_SIZE = 1 << 22
+
+
+def _parse_chunk(text, dtype):
+    """Parse complete lines of text into array of rows"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            values = np.fromstring(text.replace(',', ' '), dtype=dtype, sep=' ')
+        except (ValueError, DeprecationWarning):
+            raise ValueError('Malformed clients file: expected integer id,x,y lines')
+    if len(values) % 3:
+        raise ValueError('Malformed clients file: each line must contain id,x,y')
+    return values.reshape(-1, 3)
+
+
+def iter_text_chunks(file_name, num_of_clients=None, dtype=np.int64, chunk_size=CHUNK_SIZE):
+    """Yield arrays of client rows parsed from text file
+    chunk by chunk, stops after num_of_clients rows"""
+    remaining = np.iinfo(np.int64).max if num_of_clients is None else num_of_clients
+    tail = ''
+    with open(file_name) as file:
+        while remaining > 0:
+            block = file.read(chunk_size)
+            if block:
+                # Only complete lines are parsed, rest waits for next block
+                end = block.rfind('\n') + 1
+                if not end:
+                    tail += block
+                    continue
+                text, tail = tail + block[:end], block[end:]
+            else:
+                text, tail = tail, ''
+            if text.strip():
+                rows = _parse_chunk(text, dtype)[:remaining]
+                remaining -= len(rows)
+                yield rows
+            if not block:
+                break
+
+
+def validate_clients(rows, first_id=1):
+    """Check that ids are consecutive starting at first_id"""
+    expected = np.arange(first_id, first_id + len(rows))
+    if not np.array_equal(rows[:, 0], expected):
+        bad = np.flatnonzero(rows[:, 0] != expected)[0]
+        raise ValueError(f'Client ids must be consecutive numbers starting at 1: '
+                         f'expected {expected[bad]}, found {rows[bad, 0]}')
+
+
+def validate_coordinates(rows):
+    """Check that no two clients and no client
+    and base share the same coordinates"""
+    at_base = np.flatnonzero((rows[:, 1] == 0) & (rows[:, 2] == 0))
+    if len(at_base):
+        raise ValueError(f'Client {rows[at_base[0], 0]} has the same coordinates as base')
+    if len(rows) < 2:
+        return
+    if not np.issubdtype(rows.dtype, np.integer):
+        unique = np.unique(rows[:, 1:], axis=0)
+        if len(unique) < len(rows):
+            raise ValueError('Duplicate client coordinates')
+        return
+    # Single integer key per coordinate pair, sorting it is much faster than rows
+    x, y = rows[:, 1].astype(np.int64), rows[:, 2].astype(np.int64)
+    keys = np.sort((x - x.min()) * (y.max() - y.min() + 1) + (y - y.min()))
+    duplicates = np.flatnonzero(keys[1:] == keys[:-1])
+    if len(duplicates):
+        key = keys[duplicates[0]]
+        height = y.max() - y.min() + 1
+        raise ValueError(f'Duplicate client coordinates: '
+                         f'({key // height + x.min()}, {key % height + y.min()})')
+
+
+def load_clients_array(file_name, num_of_clients=None, dtype=np.int64, chunk_size=CHUNK_SIZE):
+    """Array of client rows validated while streaming"""
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext == '.npy':
+        rows = np.load(file_name, mmap_mode='r')[:num_of_clients]
+        validate_clients(rows)
+    elif ext == '.npz':
+        with np.load(file_name) as data:
+            rows = data['clients'][:num_of_clients]
+        validate_clients(rows)
+    else:
+        chunks, next_id = [], 1
+        for rows in iter_text_chunks(file_name, num_of_clients, dtype, chunk_size):
+            validate_clients(rows, next_id)
+            next_id += len(rows)
+            chunks.append(rows)
+        rows = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=dtype)
+    validate_coordinates(rows)
+    return rows
+
+
+def read_clients(file_name, num_of_clients=None, chunk_size=CHUNK_SIZE):
+    """ClientStore with first num_of_clients clients of file"""
+    return ClientStore.from_array(load_clients_array(file_name, num_of_clients,
+                                                     chunk_size=chunk_size))
+
+
+def save_clients(file_name, clients):
+    """Save ClientStore or array of rows in format chosen by extension"""
+    if isinstance(clients, ClientStore):
+        clients = np.column_stack((clients.ids, clients.x, clients.y))
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext == '.npy':
+        np.save(file_name, clients)
+    elif ext == '.npz':
+        np.savez(file_name, clients=clients)
+    else:
+        np.savetxt(file_name, clients, fmt='%d', delimiter=',')
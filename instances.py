@@ -0,0 +1,80 @@
+"""Seeded generators of client instances.
+
+Each generator returns integer array of rows (id, x, y) with unique
+coordinates, none of them placed in the base (0, 0).
+Instances can be saved with instance_io.save_clients.
+"""
+import numpy as np
+
+EXTENT = 35
+
+
+def _extent_for(num_of_clients, extent):
+    """Grow area when it has too few points for unique coordinates"""
+    return max(extent, int(np.ceil(np.sqrt(num_of_clients))))
+
+
+def _rows(x, y):
+    return np.column_stack((np.arange(1, len(x) + 1), x, y)).astype(np.int64)
+
+
+def _unique_cells(rng, num_of_clients, x_range, y_range):
+    """Distinct random integer points of a rectangle without base"""
+    width = x_range[1] - x_range[0] + 1
+    height = y_range[1] - y_range[0] + 1
+    cells = rng.choice(width * height, num_of_clients + 1, replace=False)
+    x = cells // height + x_range[0]
+    y = cells % height + y_range[0]
+    keep = (x != 0) | (y != 0)
+    return x[keep][:num_of_clients], y[keep][:num_of_clients]
+
+
+def uniform_clients(num_of_clients, seed=None, extent=EXTENT):
+    """Clients spread uniformly around the base"""
+    rng = np.random.default_rng(seed)
+    extent = _extent_for(num_of_clients, extent)
+    return _rows(*_unique_cells(rng, num_of_clients, (-extent, extent), (-extent, extent)))
+
+
+def depot_edge_clients(num_of_clients, seed=None, extent=EXTENT):
+    """Clients spread uniformly on one side of the base,
+    so the base lies at the edge of delivery area"""
+    rng = np.random.default_rng(seed)
+    extent = _extent_for(num_of_clients, extent)
+    return _rows(*_unique_cells(rng, num_of_clients, (0, 2 * extent), (-extent, extent)))
+
+
+def clustered_clients(num_of_clients, seed=None, extent=EXTENT, num_of_clusters=None, spread=None):
+    """Clients gathered in normally distributed clusters"""
+    rng = np.random.default_rng(seed)
+    extent = _extent_for(num_of_clients, extent)
+    if num_of_clusters is None:
+        num_of_clusters = max(2, int(np.sqrt(num_of_clients) / 3))
+    if spread is None:
+        spread = max(2.0, extent / num_of_clusters)
+    centers = rng.uniform(-extent, extent, (num_of_clusters, 2))
+    taken, x, y = {(0, 0)}, [], []
+    while len(x) < num_of_clients:
+        batch = num_of_clients - len(x)
+        points = np.rint(centers[rng.integers(num_of_clusters, size=batch)]
+                         + rng.normal(0, spread, (batch, 2))).astype(np.int64)
+        for px, py in points.tolist():
+            if (px, py) not in taken:
+                taken.add((px, py))
+                x.append(px)
+                y.append(py)
+    return _rows(x, y)
+
+
+GENERATORS = {
+    'uniform': uniform_clients,
+    'clustered': clustered_clients,
+    'depot-edge': depot_edge_clients,
+}
+
+
+def generate_clients(num_of_clients, kind='uniform', seed=None, **kwargs):
+    """Client rows generated by one of GENERATORS"""
+    if kind not in GENERATORS:
+        raise ValueError(f'Unknown instance kind: {kind}')
+    return GENERATORS[kind](num_of_clients, seed=seed, **kwargs)
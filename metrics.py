@@ -0,0 +1,91 @@
+"""Instrumentation of TabuSearch.search.
+
+Assign SearchMetrics to TabuSearch.metrics to collect per-phase
+timings and counters, None (default) disables all instrumentation.
+Records are passed to a sink, subclasses can override on_* hooks.
+"""
+from collections import Counter, defaultdict
+from time import perf_counter
+import json
+
+
+class MemorySink(list):
+    """Keeps records in memory"""
+    def __call__(self, record):
+        self.append(record)
+
+
+class JsonLinesSink:
+    """Appends records to JSON lines file"""
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = open(file_name, 'a')
+
+    def __repr__(self):
+        return f'JsonLinesSink({self.file_name})'
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class SearchMetrics:
+    """
+    sink: Callable receiving records (dicts)
+    record_iterations: Emit record for every iteration, not only summary
+    timings: Total seconds spent in each phase of search loop
+    counters: neighbors, tabu_hits (tabu moves met while selecting
+              the winner, not all tabu moves of neighborhood),
+              aspirations, improvements, iterations
+    """
+    def __init__(self, sink=None, record_iterations=False):
+        self.sink = sink if sink is not None else MemorySink()
+        self.record_iterations = record_iterations
+        self.timings = defaultdict(float)
+        self.counters = Counter()
+        self._last = None
+
+    def __repr__(self):
+        return f'SearchMetrics({dict(self.counters)})'
+
+    def start(self):
+        """Begin timing of first phase"""
+        self._last = perf_counter()
+
+    def lap(self, phase):
+        """Attribute time since previous lap to phase"""
+        now = perf_counter()
+        self.timings[phase] += now - self._last
+        self._last = now
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def on_iteration(self, iteration, candidate_cost, best_cost, neighbors, tabu_hits, aspiration):
+        self.counters['iterations'] += 1
+        self.counters['neighbors'] += neighbors
+        self.counters['tabu_hits'] += tabu_hits
+        self.counters['aspirations'] += aspiration
+        if self.record_iterations:
+            self.sink({'event': 'iteration', 'iteration': iteration, 'neighbors': neighbors,
+                       'tabu_hits': tabu_hits, 'aspiration': bool(aspiration),
+                       'candidate_cost': float(candidate_cost), 'best_cost': float(best_cost)})
+
+    def on_improvement(self, iteration, best_cost):
+        self.counters['improvements'] += 1
+        self.sink({'event': 'improvement', 'iteration': iteration, 'best_cost': float(best_cost)})
+
+    def summary(self):
+        """Totals of timings and counters"""
+        evaluation = self.timings.get('evaluation', 0.0)
+        return {
+            'event': 'summary',
+            'timings': dict(self.timings),
+            'counters': dict(self.counters),
+            'neighbors_per_second': self.counters['neighbors'] / evaluation if evaluation else None,
+        }
+
+    def on_finish(self):
+        self.sink(self.summary())
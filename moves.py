@@ -0,0 +1,274 @@
+"""Constant-time evaluation and application of neighborhood moves.
+
+Each move is a tuple (kind, id_1, samp_1, id_2, samp_2, ...):
+SWAP - client at position samp_1 of route id_1 is exchanged
+       with client at position samp_2 of route id_2
+RELOCATE - client at position samp_1 of route id_1 is moved to
+           position samp_2 of another route id_2
+TWO_OPT_STAR - tails of two different routes following positions
+               samp_1 and samp_2 are exchanged (0 - cut right after base)
+CROSS - (kind, id_1, samp_1, id_2, samp_2, len_1, len_2) segment of
+        len_1 clients starting at samp_1 is exchanged with segment of
+        len_2 clients starting at samp_2 of another route
+
+Segments keep their orientation, so every delta depends only on
+the few edges around the changed positions. Deltas of each route
+separately (for scheduling routes on a fleet) also use cumulative
+distances along routes to move tails and segments between them.
+Tabu keys identify moves by clients and routes involved instead of
+positions, reverse of a move has the same key.
+"""
+SWAP = 'swap'
+RELOCATE = 'relocate'
+TWO_OPT_STAR = '2-opt*'
+CROSS = 'cross'
+
+
+def swap_delta(distance_matrix, solution, move):
+    """Cost change of a swap move computed only from
+    the edges adjacent to the swapped positions"""
+    _, id_1, samp_1, id_2, samp_2 = move
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    a, b = r1[samp_1], r2[samp_2]
+    if id_1 != id_2:
+        p1, n1 = r1[samp_1-1], r1[samp_1+1]
+        p2, n2 = r2[samp_2-1], r2[samp_2+1]
+        return (dm[p1, b] + dm[b, n1] + dm[p2, a] + dm[a, n2]
+                - dm[p1, a] - dm[a, n1] - dm[p2, b] - dm[b, n2])
+    if samp_1 == samp_2:
+        return 0.0
+
+    def swapped(pos):
+        if pos == samp_1:
+            return b
+        if pos == samp_2:
+            return a
+        return r1[pos]
+
+    # Edge k connects positions k and k+1, adjacent swaps share an edge
+    delta = 0.0
+    for k in {samp_1-1, samp_1, samp_2-1, samp_2}:
+        delta += dm[swapped(k), swapped(k+1)] - dm[r1[k], r1[k+1]]
+    return delta
+
+
+def relocate_delta(distance_matrix, solution, move):
+    """Cost change of moving one client between two different routes"""
+    _, id_1, samp_1, id_2, samp_2 = move
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    p, c, n = r1[samp_1-1], r1[samp_1], r1[samp_1+1]
+    q, s = r2[samp_2-1], r2[samp_2]
+    return (dm[p, n] - dm[p, c] - dm[c, n]
+            + dm[q, c] + dm[c, s] - dm[q, s])
+
+
+def two_opt_star_delta(distance_matrix, solution, move):
+    """Cost change of exchanging tails of two different routes"""
+    _, id_1, samp_1, id_2, samp_2 = move
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    a, n1 = r1[samp_1], r1[samp_1+1]
+    b, n2 = r2[samp_2], r2[samp_2+1]
+    return dm[a, n2] + dm[b, n1] - dm[a, n1] - dm[b, n2]
+
+
+def cross_delta(distance_matrix, solution, move):
+    """Cost change of exchanging segments of two different routes"""
+    _, id_1, samp_1, id_2, samp_2, len_1, len_2 = move
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    p1, f1, e1, n1 = r1[samp_1-1], r1[samp_1], r1[samp_1+len_1-1], r1[samp_1+len_1]
+    p2, f2, e2, n2 = r2[samp_2-1], r2[samp_2], r2[samp_2+len_2-1], r2[samp_2+len_2]
+    return (dm[p1, f2] + dm[e2, n1] + dm[p2, f1] + dm[e1, n2]
+            - dm[p1, f1] - dm[e1, n1] - dm[p2, f2] - dm[e2, n2])
+
+
+def swap_route_deltas(distance_matrix, solution, prefix, move):
+    _, id_1, samp_1, id_2, samp_2 = move
+    if id_1 == id_2:
+        return swap_delta(distance_matrix, solution, move), 0.0
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    p1, a, n1 = r1[samp_1-1], r1[samp_1], r1[samp_1+1]
+    p2, b, n2 = r2[samp_2-1], r2[samp_2], r2[samp_2+1]
+    return (dm[p1, b] + dm[b, n1] - dm[p1, a] - dm[a, n1],
+            dm[p2, a] + dm[a, n2] - dm[p2, b] - dm[b, n2])
+
+
+def relocate_route_deltas(distance_matrix, solution, prefix, move):
+    _, id_1, samp_1, id_2, samp_2 = move
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    p, c, n = r1[samp_1-1], r1[samp_1], r1[samp_1+1]
+    q, s = r2[samp_2-1], r2[samp_2]
+    return dm[p, n] - dm[p, c] - dm[c, n], dm[q, c] + dm[c, s] - dm[q, s]
+
+
+def two_opt_star_route_deltas(distance_matrix, solution, prefix, move):
+    _, id_1, samp_1, id_2, samp_2 = move
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    c1, c2 = prefix[id_1][-1], prefix[id_2][-1]
+    # Tails carry their own length to the other route
+    tail_1, tail_2 = c1 - prefix[id_1][samp_1+1], c2 - prefix[id_2][samp_2+1]
+    new_1 = prefix[id_1][samp_1] + dm[r1[samp_1], r2[samp_2+1]] + tail_2
+    new_2 = prefix[id_2][samp_2] + dm[r2[samp_2], r1[samp_1+1]] + tail_1
+    return new_1 - c1, new_2 - c2
+
+
+def cross_route_deltas(distance_matrix, solution, prefix, move):
+    _, id_1, samp_1, id_2, samp_2, len_1, len_2 = move
+    dm = distance_matrix
+    r1, r2 = solution[id_1], solution[id_2]
+    p1, f1, e1, n1 = r1[samp_1-1], r1[samp_1], r1[samp_1+len_1-1], r1[samp_1+len_1]
+    p2, f2, e2, n2 = r2[samp_2-1], r2[samp_2], r2[samp_2+len_2-1], r2[samp_2+len_2]
+    seg_1 = prefix[id_1][samp_1+len_1-1] - prefix[id_1][samp_1]
+    seg_2 = prefix[id_2][samp_2+len_2-1] - prefix[id_2][samp_2]
+    return (dm[p1, f2] + seg_2 + dm[e2, n1] - dm[p1, f1] - seg_1 - dm[e1, n1],
+            dm[p2, f1] + seg_1 + dm[e1, n2] - dm[p2, f2] - seg_2 - dm[e2, n2])
+
+
+def apply_swap(solution, move):
+    """Returns new solution with swap applied,
+    only affected routes are copied"""
+    _, id_1, samp_1, id_2, samp_2 = move
+    new_solution = solution[:]
+    r1 = new_solution[id_1] = solution[id_1][:]
+    r2 = new_solution[id_2] = r1 if id_1 == id_2 else solution[id_2][:]
+    r1[samp_1], r2[samp_2] = r2[samp_2], r1[samp_1]
+    return new_solution
+
+
+def apply_relocate(solution, move):
+    """Returns new solution with relocation applied,
+    only affected routes are copied"""
+    _, id_1, samp_1, id_2, samp_2 = move
+    new_solution = solution[:]
+    r1 = new_solution[id_1] = solution[id_1][:]
+    r2 = new_solution[id_2] = solution[id_2][:]
+    r2.insert(samp_2, r1.pop(samp_1))
+    return new_solution
+
+
+def apply_two_opt_star(solution, move):
+    """Returns new solution with tails exchanged,
+    only affected routes are copied"""
+    _, id_1, samp_1, id_2, samp_2 = move
+    new_solution = solution[:]
+    r1, r2 = solution[id_1], solution[id_2]
+    new_solution[id_1] = r1[:samp_1+1] + r2[samp_2+1:]
+    new_solution[id_2] = r2[:samp_2+1] + r1[samp_1+1:]
+    return new_solution
+
+
+def apply_cross(solution, move):
+    """Returns new solution with segments exchanged,
+    only affected routes are copied"""
+    _, id_1, samp_1, id_2, samp_2, len_1, len_2 = move
+    new_solution = solution[:]
+    r1, r2 = solution[id_1], solution[id_2]
+    new_solution[id_1] = r1[:samp_1] + r2[samp_2:samp_2+len_2] + r1[samp_1+len_1:]
+    new_solution[id_2] = r2[:samp_2] + r1[samp_1:samp_1+len_1] + r2[samp_2+len_2:]
+    return new_solution
+
+
+def route_loads(solution, move):
+    """Number of clients in both routes of a move after it is applied"""
+    kind, id_1, samp_1, id_2, samp_2 = move[:5]
+    n1, n2 = len(solution[id_1]) - 2, len(solution[id_2]) - 2
+    if kind == RELOCATE:
+        return n1 - 1, n2 + 1
+    if kind == TWO_OPT_STAR:
+        return samp_1 + n2 - samp_2, samp_2 + n1 - samp_1
+    if kind == CROSS:
+        len_1, len_2 = move[5:]
+        return n1 - len_1 + len_2, n2 - len_2 + len_1
+    return n1, n2
+
+
+def swap_key(solution, move):
+    _, id_1, samp_1, id_2, samp_2 = move
+    a, b = solution[id_1][samp_1], solution[id_2][samp_2]
+    return (SWAP, min(a, b), max(a, b), min(id_1, id_2), max(id_1, id_2))
+
+
+def relocate_key(solution, move):
+    _, id_1, samp_1, id_2, _ = move
+    return (RELOCATE, solution[id_1][samp_1], min(id_1, id_2), max(id_1, id_2))
+
+
+def two_opt_star_key(solution, move):
+    """Clients the tails are cut after, they stay
+    the cut points of the reverse move"""
+    return (TWO_OPT_STAR,) + swap_key(solution, move)[1:]
+
+
+def cross_key(solution, move):
+    _, id_1, samp_1, id_2, samp_2, len_1, len_2 = move
+    first = sorted([(solution[id_1][samp_1], len_1), (solution[id_2][samp_2], len_2)])
+    return (CROSS,) + first[0] + first[1] + (min(id_1, id_2), max(id_1, id_2))
+
+
+def swap_relabel(key, mapping):
+    kind, a, b, id_1, id_2 = key
+    a, b = mapping.get(a, a), mapping.get(b, b)
+    if a is None or b is None:
+        return None
+    return (kind, min(a, b), max(a, b), id_1, id_2)
+
+
+def relocate_relabel(key, mapping):
+    kind, c, id_1, id_2 = key
+    c = mapping.get(c, c)
+    return None if c is None else (kind, c, id_1, id_2)
+
+
+def cross_relabel(key, mapping):
+    kind, a, len_a, b, len_b, id_1, id_2 = key
+    a, b = mapping.get(a, a), mapping.get(b, b)
+    if a is None or b is None:
+        return None
+    first = sorted([(a, len_a), (b, len_b)])
+    return (kind,) + first[0] + first[1] + (id_1, id_2)
+
+
+OPERATORS = [SWAP, RELOCATE, TWO_OPT_STAR, CROSS]
+DELTAS = {SWAP: swap_delta, RELOCATE: relocate_delta,
+          TWO_OPT_STAR: two_opt_star_delta, CROSS: cross_delta}
+KEYS = {SWAP: swap_key, RELOCATE: relocate_key,
+        TWO_OPT_STAR: two_opt_star_key, CROSS: cross_key}
+APPLY = {SWAP: apply_swap, RELOCATE: apply_relocate,
+         TWO_OPT_STAR: apply_two_opt_star, CROSS: apply_cross}
+ROUTE_DELTAS = {SWAP: swap_route_deltas, RELOCATE: relocate_route_deltas,
+                TWO_OPT_STAR: two_opt_star_route_deltas, CROSS: cross_route_deltas}
+RELABEL = {SWAP: swap_relabel, RELOCATE: relocate_relabel,
+           TWO_OPT_STAR: swap_relabel, CROSS: cross_relabel}
+
+
+def move_delta(distance_matrix, solution, move):
+    """Cost change of any supported move"""
+    return DELTAS[move[0]](distance_matrix, solution, move)
+
+
+def route_deltas(distance_matrix, solution, prefix, move):
+    """Cost changes of both routes of any supported move,
+    prefix: cumulative distance along every route of solution"""
+    return ROUTE_DELTAS[move[0]](distance_matrix, solution, prefix, move)
+
+
+def move_key(solution, move):
+    """Tabu key of any supported move"""
+    return KEYS[move[0]](solution, move)
+
+
+def apply_move(solution, move):
+    """Returns new solution with any supported move applied"""
+    return APPLY[move[0]](solution, move)
+
+
+def relabel_key(key, mapping):
+    """Tabu key with client ids renamed by mapping (old id -> new id),
+    None when key involves client mapped to None"""
+    return RELABEL[key[0]](key, mapping)
@@ -0,0 +1,67 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from store import ClientStore
+from tabu_search import TabuSearch
+import numpy as np
+import random
+
+MultiStartResult = namedtuple('MultiStartResult',
+                              ['best_solution', 'best_cost', 'seeds', 'costs', 'best_costs'])
+
+
+def _run_search(shm_name, shape, dtype, clients, params, seed, search_kwargs):
+    """Worker: single search on distance matrix attached from shared memory"""
+    shm = SharedMemory(name=shm_name)
+    try:
+        distance_matrix = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        random.seed(seed)
+        np.random.seed(seed)
+        ts = TabuSearch(*params, clients=ClientStore.from_array(clients),
+                        distance_matrix=distance_matrix)
+        # search_iter rather than search, whose timer output would interleave
+        for _ in ts.search_iter(**search_kwargs):
+            pass
+        result = (ts.best_solution, ts.best_cost, ts.costs, ts.best_costs)
+        # Release views of shared buffer before closing it
+        del ts, distance_matrix
+        return result
+    finally:
+        shm.close()
+
+
+def multi_start_search(ts, n_starts=4, max_workers=None, seeds=None, **search_kwargs):
+    """Run n_starts independent searches of ts instance with different
+    seeds in a process pool, distance matrix is shared between workers
+    through shared memory instead of being pickled to each of them.
+    Best run is stored in ts as if ts.search was called.
+    search_kwargs: Arguments passed to TabuSearch.search_iter"""
+    if seeds is None:
+        seeds = [random.randrange(2**32) for _ in range(n_starts)]
+    matrix = np.ascontiguousarray(ts.distance_matrix)
+    shm = SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    try:
+        shared = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)
+        shared[:] = matrix
+        del shared
+        clients = np.column_stack((ts.clients.ids, ts.clients.x, ts.clients.y))
+        params = (ts.M, ts.Q, ts.N)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_run_search, shm.name, matrix.shape, matrix.dtype,
+                                       clients, params, seed, search_kwargs)
+                       for seed in seeds]
+            runs = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    best = min(range(len(runs)), key=lambda i: runs[i][1])
+    best_solution, best_cost, costs, best_costs = runs[best]
+    ts.best_solution = ts.best_candidate = best_solution
+    ts.best_cost = ts.candidate_cost = best_cost
+    ts.route_costs = [ts.route_fitness(r) for r in best_solution]
+    ts.costs, ts.best_costs = costs, best_costs
+    ts.processed_solution = {}
+    ts.process_solution()
+    return MultiStartResult(best_solution, best_cost, seeds,
+                            [run[2] for run in runs], [run[3] for run in runs])
@@ -0,0 +1,143 @@
+"""Intra-route optimization: order of clients within a single route.
+Each route starts and ends at fixed points (base), only
+clients between them are reordered.
+"""
+import numpy as np
+
+EXACT_LIMIT = 10
+
+
+def route_cost(distance_matrix, route):
+    """Sum of distances between consecutive points of route"""
+    route = np.asarray(route)
+    return distance_matrix[route[:-1], route[1:]].sum()
+
+
+def held_karp(distance_matrix, route):
+    """Exact optimal order by dynamic programming over subsets
+    of clients (bitmasks), O(2^n * n^2) for n clients"""
+    clients = np.asarray(route[1:-1])
+    n = len(clients)
+    if n < 2:
+        return list(route)
+    d = np.asarray(distance_matrix[np.ix_(clients, clients)], dtype=np.float64)
+    start = np.asarray(distance_matrix[route[0], clients], dtype=np.float64)
+    end = np.asarray(distance_matrix[clients, route[-1]], dtype=np.float64)
+
+    # cost[mask, j] - shortest path from start through clients in mask ending in j
+    full = 1 << n
+    cost = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int64)
+    bits = 1 << np.arange(n)
+    cost[bits, np.arange(n)] = start
+    for mask in range(1, full):
+        members = np.flatnonzero(mask & bits)
+        if len(members) < 2:
+            continue
+        # For each last client j: best previous client k from mask without j
+        prev = cost[mask ^ bits[members]][:, members] + d[np.ix_(members, members)].T
+        best = prev.argmin(axis=1)
+        cost[mask, members] = prev[np.arange(len(members)), best]
+        parent[mask, members] = members[best]
+
+    last = int(np.argmin(cost[full-1] + end))
+    order, mask = [], full - 1
+    while last != -1:
+        order.append(int(clients[last]))
+        mask, last = mask ^ (1 << last), parent[mask, last]
+    return [route[0]] + order[::-1] + [route[-1]]
+
+
+def two_opt(distance_matrix, route):
+    """Reverse route segments while it shortens the route"""
+    route = list(route)
+    dm = distance_matrix
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(route) - 2):
+            a, b = route[i-1], route[i]
+            c = np.asarray(route[i+1:-1])
+            e = np.asarray(route[i+2:])
+            # Gain of reversing route[i:j+1] for every j > i
+            gain = dm[a, b] + dm[c, e] - dm[a, c] - dm[b, e]
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                j += i + 1
+                route[i:j+1] = route[i:j+1][::-1]
+                improved = True
+    return route
+
+
+def or_opt(distance_matrix, route, max_segment=3):
+    """Move segments of up to max_segment consecutive clients
+    to their best position while it shortens the route"""
+    route = list(route)
+    dm = distance_matrix
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, max_segment + 1):
+            for i in range(1, len(route) - length):
+                segment = route[i:i+length]
+                p, n = route[i-1], route[i+length]
+                rest = route[:i] + route[i+length:]
+                removal = dm[p, segment[0]] + dm[segment[-1], n] - dm[p, n]
+                best_gain, best_pos, best_rev = 1e-9, None, False
+                for pos in range(1, len(rest)):
+                    if pos == i:
+                        continue
+                    q, s = rest[pos-1], rest[pos]
+                    for rev, (first, last) in ((False, (segment[0], segment[-1])),
+                                               (True, (segment[-1], segment[0]))):
+                        gain = removal - (dm[q, first] + dm[last, s] - dm[q, s])
+                        if gain > best_gain:
+                            best_gain, best_pos, best_rev = gain, pos, rev
+                if best_pos is not None:
+                    if best_rev:
+                        segment = segment[::-1]
+                    route = rest[:best_pos] + segment + rest[best_pos:]
+                    improved = True
+                    break
+            if improved:
+                break
+    return route
+
+
+def local_search(distance_matrix, route):
+    """2-opt followed by Or-opt until none of them improves"""
+    best, best_cost = list(route), route_cost(distance_matrix, route)
+    while True:
+        candidate = or_opt(distance_matrix, two_opt(distance_matrix, best))
+        candidate_cost = route_cost(distance_matrix, candidate)
+        if candidate_cost >= best_cost - 1e-9:
+            return best
+        best, best_cost = candidate, candidate_cost
+
+
+STRATEGIES = {
+    'exact': held_karp,
+    '2-opt': two_opt,
+    'or-opt': or_opt,
+    'local': local_search,
+}
+
+
+def _best_of(distance_matrix, route, candidates):
+    return min(candidates, key=lambda r: route_cost(distance_matrix, r))
+
+
+def optimize_route(distance_matrix, route, strategy='auto', exact_limit=EXACT_LIMIT):
+    """Reorder clients of route with chosen strategy:
+    'auto' - exact for at most exact_limit clients, local search otherwise
+    'exact', '2-opt', 'or-opt', 'local' - see STRATEGIES
+    Route with less than 2 clients is returned unchanged"""
+    if len(route) < 4:
+        return list(route)
+    if strategy == 'auto':
+        strategy = 'exact' if len(route) - 2 <= exact_limit else 'local'
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown route optimization strategy: {strategy}')
+    optimized = STRATEGIES[strategy](distance_matrix, route)
+    # Never return a worse route than the given one
+    return _best_of(distance_matrix, route, [list(route), optimized])
@@ -0,0 +1,165 @@
+"""Scheduling of routes (trips) on a fleet of drones.
+
+Each drone flies its trips one after another starting from base,
+so the delivery wave ends when the busiest drone finishes (makespan).
+Trips are scheduled longest first, each to the drone which comes back
+to base first (heap of drone availability times).
+"""
+import heapq
+import numpy as np
+
+
+def schedule_trips(durations, num_of_drones):
+    """Longest processing time first schedule,
+    returns drone of every trip and total duration of every drone"""
+    heap = [(0.0, drone) for drone in range(num_of_drones)]
+    assignment = [0] * len(durations)
+    loads = [0.0] * num_of_drones
+    for trip in sorted(range(len(durations)), key=lambda t: -durations[t]):
+        load, drone = heapq.heappop(heap)
+        assignment[trip] = drone
+        loads[drone] = load + durations[trip]
+        heapq.heappush(heap, (loads[drone], drone))
+    return assignment, loads
+
+
+class FleetSchedule:
+    """
+    durations: Duration of every trip
+    assignment: Drone flying each trip, trips stay on their drones
+                when durations change unless new schedule is shorter
+    loads: Time at which each drone finishes its trips
+    makespan: Time at which the last drone finishes
+    refresh: Calls of update_trips between full updates
+    """
+    def __init__(self, durations, num_of_drones, assignment=None, refresh=100):
+        self.num_of_drones = num_of_drones
+        self.assignment = assignment
+        self.refresh = refresh
+        self.updates = 0
+        self.update(durations)
+
+    def __repr__(self):
+        return f'FleetSchedule({len(self.durations)} trips, {self.num_of_drones} drones, makespan: {self.makespan:.1f})'
+
+    def update(self, durations):
+        """Schedule trips with new durations"""
+        self.durations = list(durations)
+        assignment, loads = schedule_trips(self.durations, self.num_of_drones)
+        if self.assignment is not None and len(self.assignment) == len(self.durations):
+            kept = [0.0] * self.num_of_drones
+            for trip, drone in enumerate(self.assignment):
+                kept[drone] += self.durations[trip]
+            # Stable assignment keeps estimates of makespan_after exact
+            if max(kept, default=0.0) <= max(loads, default=0.0):
+                assignment, loads = list(self.assignment), kept
+        self.assignment, self.loads = assignment, loads
+        self._rebalance()
+        self._set_loads(self.loads)
+
+    def _set_loads(self, loads):
+        self.loads = loads
+        self.makespan = max(self.loads, default=0.0)
+        # Enough busiest drones to find the busiest one not changed by a move
+        self._busiest = sorted(range(self.num_of_drones), key=lambda d: -self.loads[d])[:3]
+
+    def update_trips(self, durations):
+        """Change durations of some trips (trip -> duration) in time
+        proportional to number of drones, trips stay on their drones
+        unless makespan grows (then trips are rebalanced). Every
+        `refresh` calls schedule is fully updated, which also clears
+        rounding errors of loads"""
+        makespan = self.makespan
+        for trip, duration in durations.items():
+            self.loads[self.assignment[trip]] += duration - self.durations[trip]
+            self.durations[trip] = duration
+        self.updates += 1
+        if self.updates % self.refresh == 0:
+            self.update(self.durations)
+            return
+        self._set_loads(self.loads)
+        if self.makespan > makespan:
+            self._rebalance()
+            self._set_loads(self.loads)
+
+    @classmethod
+    def from_state(cls, durations, num_of_drones, assignment, loads, updates=0, refresh=100):
+        """Schedule restored exactly as it was saved, without rescheduling"""
+        schedule = cls.__new__(cls)
+        schedule.num_of_drones = num_of_drones
+        schedule.refresh = refresh
+        schedule.updates = updates
+        schedule.durations = list(durations)
+        schedule.assignment = list(assignment)
+        schedule._set_loads(list(loads))
+        return schedule
+
+    def _rebalance(self):
+        """Move or swap trips between the busiest and the least busy
+        drone while it shortens the busiest one's schedule"""
+        loads, durations, assignment = self.loads, self.durations, self.assignment
+        for _ in range(len(durations)):
+            busiest = max(range(self.num_of_drones), key=loads.__getitem__, default=None)
+            idlest = min(range(self.num_of_drones), key=loads.__getitem__, default=None)
+            if busiest == idlest:
+                return
+            gap = loads[busiest] - loads[idlest]
+            drones = np.asarray(assignment)
+            busy_trips = np.flatnonzero(drones == busiest)
+            idle_trips = np.flatnonzero(drones == idlest)
+            trip_durations = np.asarray(durations)
+            # Shift of duration from busiest to idlest drone for every move
+            # of a busy trip (last column) or swap with an idle one
+            shifts = trip_durations[busy_trips, None] - np.append(trip_durations[idle_trips], 0.0)
+            gains = np.where((shifts > 0) & (shifts < gap), np.minimum(shifts, gap - shifts), 0.0)
+            if not gains.size:
+                return
+            # First pair with the largest gain, in order of trips
+            best = np.argmax(gains)
+            if gains.flat[best] <= 0:
+                return
+            row, col = divmod(best.item(), gains.shape[1])
+            best_shift = shifts[row, col].item()
+            t = busy_trips[row].item()
+            u = idle_trips[col].item() if col < len(idle_trips) else None
+            assignment[t] = idlest
+            if u is not None:
+                assignment[u] = busiest
+            loads[busiest] -= best_shift
+            loads[idlest] += best_shift
+
+    def makespan_after(self, trip_1, delta_1, trip_2=None, delta_2=0.0):
+        """Makespan in constant time after durations of one or two trips
+        change by given deltas and trips stay on their drones"""
+        loads = self.loads
+        drone_1 = self.assignment[trip_1]
+        drone_2 = drone_1 if trip_2 is None else self.assignment[trip_2]
+        if drone_1 == drone_2:
+            makespan = loads[drone_1] + delta_1 + delta_2
+        else:
+            makespan = max(loads[drone_1] + delta_1, loads[drone_2] + delta_2)
+        for drone in self._busiest:
+            if drone != drone_1 and drone != drone_2:
+                return max(makespan, loads[drone])
+        return makespan
+
+    def makespans_after(self, trips_1, deltas_1, trips_2, deltas_2):
+        """makespan_after of many moves at once, arrays of trips
+        and deltas (second trip equal to first with delta 0 when
+        move changes one trip)"""
+        loads = np.asarray(self.loads)
+        assignment = np.asarray(self.assignment)
+        drone_1, drone_2 = assignment[trips_1], assignment[trips_2]
+        makespan = np.where(drone_1 == drone_2, loads[drone_1] + deltas_1 + deltas_2,
+                            np.maximum(loads[drone_1] + deltas_1, loads[drone_2] + deltas_2))
+        busiest = np.array(self._busiest, dtype=np.intp)
+        other = (busiest != drone_1[:, None]) & (busiest != drone_2[:, None])
+        unchanged = loads[busiest[other.argmax(axis=1)]]
+        return np.where(other.any(axis=1), np.maximum(makespan, unchanged), makespan)
+
+    def trips(self):
+        """Trips of every drone in order they are flown"""
+        trips = [[] for _ in range(self.num_of_drones)]
+        for trip in sorted(range(len(self.durations)), key=lambda t: -self.durations[t]):
+            trips[self.assignment[trip]].append(trip)
+        return trips
@@ -0,0 +1,369 @@
+"""Asyncio solver service around TabuSearch.
+
+Requests and responses are JSON lines sent over TCP or unix socket
+(local stand-in for HTTP endpoint), one connection can carry many
+requests and responses come back as soon as they are solved:
+
+    {"id": 1, "clients": [[1, 3, 4], [2, -5, 7]], "num_of_drones": 3,
+     "drone_capacity": 4, "n_iters": 200, "seed": 0}
+    {"id": 1, "best_cost": 25.3, "routes": [[0, 2, 1, 0]],
+     "paths": [[0, 2, 1, 0], [], []], "iterations": 200}
+
+Requests arriving together are batched into single worker call, so
+many small dispatch requests don't pay executor round trip each.
+Prepared instances (distance matrix, spatial index, neighbor lists)
+are kept in LRU cache of every worker keyed by digest of client rows.
+Every search must stop: n_iters and time_budget are limited by server
+(--max-iters, --max-time-budget), requests with n_iters null need
+time_budget, and searches run at most max time budget seconds.
+
+    python service.py --port 8765 --workers 4
+"""
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from client import Client
+from distances import build_distance_matrix
+from instance_io import validate_clients, validate_coordinates
+from spatial import GridIndex
+from store import ClientStore
+from tabu_search import TabuSearch
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import numpy as np
+
+PORT = 8765
+SEARCH_PARAMS = ['tabu_size', 'n_iters', 'time_budget', 'stagnation', 'neighborhood',
+                 'num_neighbors', 'sort_candidates', 'frequency_penalty', 'operators',
+                 'makespan_weight']
+MAX_ITERS = 100000
+MAX_TIME_BUDGET = 60.0
+
+Instance = namedtuple('Instance', ['clients', 'distance_matrix', 'spatial_index', 'neighbor_lists'])
+
+
+class InstanceCache:
+    """LRU cache of prepared instances keyed by client rows
+    max_size: Number of instances kept, least recently used are evicted"""
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self.instances = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'InstanceCache({len(self)}/{self.max_size}, hits: {self.hits}, misses: {self.misses})'
+
+    def __len__(self):
+        return len(self.instances)
+
+    @staticmethod
+    def key(rows):
+        return hashlib.blake2b(np.ascontiguousarray(rows, dtype=np.int64).tobytes(),
+                               digest_size=16).hexdigest()
+
+    @staticmethod
+    def prepare(rows):
+        """Validate client rows and build everything search needs"""
+        validate_clients(rows)
+        validate_coordinates(rows)
+        clients = ClientStore.from_array(rows)
+        distance_matrix = build_distance_matrix(clients.coords(Client(0, 0, 0)))
+        spatial_index = GridIndex(clients.x, clients.y, clients.ids)
+        return Instance(clients, distance_matrix, spatial_index, {})
+
+    def get(self, rows):
+        key = self.key(rows)
+        with self.lock:
+            instance = self.instances.get(key)
+            if instance is not None:
+                self.instances.move_to_end(key)
+                self.hits += 1
+                return instance
+            self.misses += 1
+        # Built outside of lock, concurrent misses of one key only waste work
+        instance = self.prepare(rows)
+        with self.lock:
+            self.instances[key] = instance
+            self.instances.move_to_end(key)
+            while len(self.instances) > self.max_size:
+                self.instances.popitem(last=False)
+        return instance
+
+    def clear(self):
+        with self.lock:
+            self.instances.clear()
+
+
+_cache = InstanceCache()
+
+
+_limits = {'n_iters': MAX_ITERS, 'time_budget': MAX_TIME_BUDGET}
+
+
+def _init_worker(cache_size, max_iters=MAX_ITERS, max_time_budget=MAX_TIME_BUDGET):
+    _cache.max_size = cache_size
+    _limits.update(n_iters=max_iters, time_budget=max_time_budget)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def search_kwargs(request, limits=None):
+    """Search parameters of request, checked so that search stops:
+    n_iters and time_budget within limits, n_iters null only with
+    time_budget, time budget of limit when request sets none"""
+    limits = _limits if limits is None else limits
+    kwargs = {k: request[k] for k in SEARCH_PARAMS if k in request}
+    n_iters = kwargs.get('n_iters', 1000)
+    time_budget = kwargs.get('time_budget')
+    if n_iters is None and time_budget is None:
+        raise ValueError('Request needs n_iters or time_budget, search would never stop')
+    if n_iters is not None and not (isinstance(n_iters, int) and not isinstance(n_iters, bool)
+                                    and 0 <= n_iters <= limits['n_iters']):
+        raise ValueError(f"n_iters must be integer from 0 to {limits['n_iters']}")
+    if time_budget is not None and not (_is_number(time_budget)
+                                        and 0 <= time_budget <= limits['time_budget']):
+        raise ValueError(f"time_budget must be number from 0 to {limits['time_budget']}")
+    if time_budget is None:
+        kwargs['time_budget'] = limits['time_budget']
+    return kwargs
+
+
+def solve(request, cache=None):
+    """Solve single request, returns response dict.
+    Seed resets global random generators, so seeded requests are
+    reproducible only when workers are processes"""
+    cache = _cache if cache is None else cache
+    kwargs = search_kwargs(request)
+    rows = np.asarray(request['clients'], dtype=np.int64).reshape(-1, 3)
+    if not len(rows):
+        raise ValueError('Request has no clients')
+    instance = cache.get(rows)
+    ts = TabuSearch(request.get('num_of_drones', 3), request.get('drone_capacity', 4), len(rows),
+                    clients=instance.clients, distance_matrix=instance.distance_matrix,
+                    spatial_index=instance.spatial_index)
+    ts.neighbor_lists = instance.neighbor_lists
+    if request.get('seed') is not None:
+        random.seed(request['seed'])
+        np.random.seed(request['seed'])
+    for _ in ts.search_iter(**kwargs):
+        pass
+    return {
+        'id': request.get('id'),
+        'best_cost': float(ts.best_cost),
+        'routes': [[int(c) for c in route] for route in ts.best_solution],
+        'paths': [[p.id for p in path] for path in ts.processed_solution.values()],
+        'iterations': len(ts.costs) - 1,
+    }
+
+
+def solve_batch(requests):
+    """Worker: solve batch of requests, failure of one
+    request is reported in its response only"""
+    responses = []
+    for request in requests:
+        try:
+            responses.append(solve(request))
+        except Exception as e:
+            responses.append({'id': request.get('id'), 'error': f'{type(e).__name__}: {e}'})
+    return responses
+
+
+class SolverService:
+    """
+    executor: Executor running batches, by default process pool
+              of max_workers processes, each with own instance cache
+    batch_size: Maximum number of requests in one batch
+    batch_clients: Maximum total number of clients in one batch,
+                   larger requests are dispatched alone
+    batch_delay: Seconds to wait for more requests before dispatching batch
+    cache_size: Instances cached by each worker of default executor
+    max_iters, max_time_budget: Search limits of default executor's workers,
+                                other executors use MAX_ITERS and MAX_TIME_BUDGET
+    """
+    def __init__(self, executor=None, max_workers=None, batch_size=32, batch_clients=2000,
+                 batch_delay=0.002, cache_size=32, max_iters=MAX_ITERS,
+                 max_time_budget=MAX_TIME_BUDGET):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.own_executor = executor is None
+        if executor is None:
+            executor = ProcessPoolExecutor(self.max_workers, initializer=_init_worker,
+                                           initargs=(cache_size, max_iters, max_time_budget))
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_clients = batch_clients
+        self.batch_delay = batch_delay
+        self.queue = None
+        self.batcher = None
+        self.batches = set()
+        self._pending = None
+
+    def __repr__(self):
+        return f'SolverService(workers: {self.max_workers}, batch size: {self.batch_size})'
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.create_task(self._collect_batches())
+
+    async def stop(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+            await asyncio.gather(self.batcher, return_exceptions=True)
+            self.batcher = None
+        await asyncio.gather(*self.batches, return_exceptions=True)
+        if self.own_executor:
+            self.executor.shutdown()
+
+    async def solve(self, request):
+        """Queue request and wait for its response"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return await future
+
+    async def _next_request(self, timeout):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+            return item
+        if timeout is None:
+            return await self.queue.get()
+        if timeout <= 0:
+            return self.queue.get_nowait()
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._next_request(None)
+            batch, size = [item], len(item[0].get('clients', ()))
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = await self._next_request(deadline - loop.time())
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                clients = len(item[0].get('clients', ()))
+                if size + clients > self.batch_clients:
+                    self._pending = item
+                    break
+                batch.append(item)
+                size += clients
+            # Spread batch over workers instead of queueing it behind one of them
+            step = -(-len(batch) // self.max_workers)
+            for i in range(0, len(batch), step):
+                task = asyncio.create_task(self._run_batch(batch[i:i + step]))
+                self.batches.add(task)
+                task.add_done_callback(self.batches.discard)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            responses = await loop.run_in_executor(self.executor, solve_batch,
+                                                   [request for request, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+    async def _respond(self, line, writer):
+        try:
+            request = json.loads(line)
+            response = await self.solve(request)
+        except Exception as e:
+            response = {'error': f'{type(e).__name__}: {e}'}
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        """Serve JSON lines requests of one connection"""
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(self._respond(line, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=PORT, path=None):
+        """Listen on TCP port or unix socket path until cancelled"""
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+async def request(requests, host='127.0.0.1', port=PORT, path=None):
+    """Send requests over one connection, returns responses
+    in order of requests (requests without id get their index)"""
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    requests = [r if r.get('id') is not None else {**r, 'id': i} for i, r in enumerate(requests)]
+    try:
+        writer.write(b''.join(json.dumps(r).encode() + b'\n' for r in requests))
+        await writer.drain()
+        responses = {}
+        while len(responses) < len(requests):
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError('Service closed connection')
+            response = json.loads(line)
+            responses[response.get('id')] = response
+    finally:
+        writer.close()
+    return [responses[r['id']] for r in requests]
+
+
+async def _serve(args):
+    async with SolverService(max_workers=args.workers, batch_size=args.batch_size,
+                             batch_delay=args.batch_delay, cache_size=args.cache_size,
+                             max_iters=args.max_iters,
+                             max_time_budget=args.max_time_budget) as service:
+        await service.serve(args.host, args.port, args.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--path', help='Unix socket path used instead of TCP port')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--batch-delay', type=float, default=0.002)
+    parser.add_argument('--cache-size', type=int, default=32)
+    parser.add_argument('--max-iters', type=int, default=MAX_ITERS)
+    parser.add_argument('--max-time-budget', type=float, default=MAX_TIME_BUDGET)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+from collections import namedtuple
+import heapq
+import numpy as np
+
+BASE_EVENT = 'base'
+DELIVERY_EVENT = 'delivery'
+
+Event = namedtuple('Event', ['time', 'drone_id', 'packages', 'client_id', 'kind'])
+
+
+def travel_ticks(x, y, x_client, y_client):
+    """Number of minutes Drone.travel needs to reach a point,
+    replays its 1-unit steps exactly"""
+    ticks = 1
+    while True:
+        distance = np.sqrt((x_client-x)**2 + (y_client-y)**2)
+        if distance <= 1:
+            return ticks
+        x = x + 1/distance * (x_client - x)
+        y = y + 1/distance * (y_client - y)
+        ticks += 1
+
+
+class SimulationResult:
+    """
+    events: Events ordered as they happen
+    completion_times: Time of last event of each drone
+    """
+    def __init__(self, events, completion_times):
+        self.events = events
+        self.completion_times = completion_times
+
+    def __repr__(self):
+        return f'SimulationResult({len(self.events)} events, makespan: {self.makespan})'
+
+    @property
+    def makespan(self):
+        return max(self.completion_times.values(), default=0)
+
+    def log(self):
+        """Events formatted as Drone logs"""
+        return [format_event(e) for e in self.events]
+
+    def write(self, delivery_log):
+        """Add all events to DeliveryLog"""
+        for event in self.events:
+            delivery_log.log(event)
+
+
+def format_event(event):
+    """Log line of event, same as written by Drone"""
+    prefix = f"Time: {event.time} min  (Drone: {event.drone_id} | Packages: {event.packages})"
+    if event.kind == BASE_EVENT:
+        return f"{prefix} - In base"
+    return f"{prefix} - Package delivered to client with id {event.client_id}"
+
+
+class EventSimulator:
+    """Discrete-event replay of drone routes without visualization.
+    Arrival times are computed from distance matrix, so simulation cost
+    depends on number of stops, not on length of the routes.
+    Produces the same events and timings as WithVisualization.
+    distance_matrix: Distances between points, 0 - base
+    coords: Array (N+1, 2) of point coordinates, 0 - base"""
+    # Distances this close to an integer are replayed step by step
+    # because rounding of 1-unit steps decides the arrival minute
+    TOLERANCE = 1e-6
+
+    def __init__(self, distance_matrix, coords):
+        self.distance_matrix = distance_matrix
+        self.coords = np.asarray(coords)
+
+    @classmethod
+    def from_search(cls, ts):
+        return cls(ts.distance_matrix, ts.clients.coords(ts.BASE))
+
+    def leg_ticks(self, route):
+        """Minutes needed for each leg of route"""
+        route = np.asarray(route)
+        distances = np.asarray(self.distance_matrix[route[:-1], route[1:]], dtype=np.float64)
+        ticks = np.maximum(np.ceil(distances), 1).astype(np.int64)
+        for i in np.flatnonzero(np.abs(distances - np.round(distances)) < self.TOLERANCE):
+            (x, y), (x_client, y_client) = self.coords[route[i]], self.coords[route[i+1]]
+            ticks[i] = travel_ticks(x.item(), y.item(), x_client.item(), y_client.item())
+        return ticks
+
+    def arrival_times(self, route):
+        """Arrival time at each point of route. Drone starts in base:
+        one minute to take next point, then travel to it"""
+        ticks = self.leg_ticks([0] + list(route))
+        return np.cumsum(ticks + 1) - 1
+
+    def run(self, routes, capacities):
+        """Simulate routes: dict drone id -> list of point ids
+        capacities: dict drone id -> capacity"""
+        queue, schedules = [], {}
+        # Drone order breaks ties, same as iteration over drones
+        for order, (drone_id, route) in enumerate(routes.items()):
+            if len(route) == 0:
+                continue
+            schedules[drone_id] = (route, self.arrival_times(route).tolist())
+            heapq.heappush(queue, (schedules[drone_id][1][0], order, drone_id, 0, 0))
+
+        events, completion_times = [], {}
+        while queue:
+            time, order, drone_id, idx, packages = heapq.heappop(queue)
+            route, times = schedules[drone_id]
+            client_id = route[idx]
+            if client_id == 0:
+                packages = capacities[drone_id]
+                events.append(Event(time, drone_id, packages, client_id, BASE_EVENT))
+            else:
+                packages -= 1
+                events.append(Event(time, drone_id, packages, client_id, DELIVERY_EVENT))
+            if idx + 1 < len(route):
+                heapq.heappush(queue, (times[idx+1], order, drone_id, idx + 1, packages))
+            else:
+                completion_times[drone_id] = time
+        return SimulationResult(events, completion_times)
+
+    def run_solution(self, processed_solution):
+        """Simulate processed solution of TabuSearch (drone -> path)"""
+        routes = {d.id: [p.id for p in path] for d, path in processed_solution.items()}
+        capacities = {d.id: d.capacity for d in processed_solution}
+        return self.run(routes, capacities)
@@ -0,0 +1,193 @@
+import numpy as np
+
+# Max number of point pairs whose distances are held at once by neighbors()
+MAX_PAIRS = 2**20
+
+
+class GridIndex:
+    """Uniform grid over points for nearest neighbor queries
+    x, y: Coordinates of points
+    ids: Identifiers returned by queries (defaults to positions)
+    cell_size: Side of grid cell, by default about two points per cell
+               over the central 90% of points on each axis"""
+    def __init__(self, x, y, ids=None, cell_size=None):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.ids = np.arange(len(self.x)) if ids is None else np.asarray(ids)
+        if cell_size is None:
+            cell_size = self._default_cell_size()
+        self.cell_size = max(float(cell_size), 1e-9)
+        self._build_grid()
+
+    def __repr__(self):
+        return f'GridIndex({len(self.x)} points, {self.nx}x{self.ny} cells)'
+
+    def _default_cell_size(self):
+        """Extents of quantiles rather than of bounding box, so a few
+        far points don't put all others into one cell, and each extent
+        at least one cell, so points on a line don't get tiny cells"""
+        n = len(self.x)
+        low, high = np.quantile(np.column_stack((self.x, self.y)), [0.05, 0.95], axis=0)
+        short, long = np.sort(high - low)
+        cell_size = np.sqrt(2 * short * long / n)
+        if short <= cell_size:
+            cell_size = 2 * long / n
+        return cell_size if cell_size > 0 else 1.0
+
+    def _build_grid(self):
+        self.x_min, self.y_min = self.x.min(), self.y.min()
+        cx, cy = self._cell(self.x, self.y)
+        self.nx, self.ny = cx.max() + 1, cy.max() + 1
+        self.cells = self._build_cells(cx, cy)
+        self._occupied = None
+
+    def _cell(self, x, y):
+        cx = np.floor((x - self.x_min) / self.cell_size).astype(np.int64)
+        cy = np.floor((y - self.y_min) / self.cell_size).astype(np.int64)
+        return cx, cy
+
+    def _cell_of(self, position):
+        cx, cy = self._cell(self.x[position], self.y[position])
+        return int(cx), int(cy)
+
+    def _build_cells(self, cx, cy):
+        """Map each occupied cell to positions of its points"""
+        keys = cx * (cy.max() + 1) + cy
+        order = np.argsort(keys, kind='stable')
+        unique, starts = np.unique(keys[order], return_index=True)
+        groups = np.split(order, starts[1:])
+        height = cy.max() + 1
+        return {(int(k // height), int(k % height)): g for k, g in zip(unique, groups)}
+
+    def _occupied_cells(self):
+        """Coordinates and point counts of occupied cells,
+        cached until points are inserted or removed"""
+        if self._occupied is None:
+            coords = np.array(list(self.cells), dtype=np.int64).reshape(-1, 2)
+            counts = np.fromiter((len(g) for g in self.cells.values()),
+                                 dtype=np.int64, count=len(self.cells))
+            self._occupied = (coords, counts)
+        return self._occupied
+
+    def _rings(self, cx, cy):
+        """Ring (Chebyshev distance in cells) of every occupied cell"""
+        coords, counts = self._occupied_cells()
+        return np.maximum(np.abs(coords[:, 0] - cx), np.abs(coords[:, 1] - cy)), counts
+
+    def _block(self, cx, cy, r):
+        """Positions of points in cells within r cells from (cx, cy)"""
+        i_range = range(max(cx - r, 0), min(cx + r, self.nx - 1) + 1)
+        j_range = range(max(cy - r, 0), min(cy + r, self.ny - 1) + 1)
+        if len(i_range) * len(j_range) <= len(self.cells):
+            found = [self.cells[i, j] for i in i_range for j in j_range if (i, j) in self.cells]
+        else:
+            # Wide block, pick occupied cells instead of visiting empty ones
+            coords = self._occupied_cells()[0]
+            inside = coords[self._rings(cx, cy)[0] <= r]
+            inside = inside[np.lexsort((inside[:, 1], inside[:, 0]))]
+            found = [self.cells[i, j] for i, j in inside.tolist()]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def _radius_covering(self, cx, cy, needed):
+        """Smallest ring radius with at least `needed` points"""
+        for r in (0, 1):
+            if len(self._block(cx, cy, r)) >= needed:
+                return r
+        rings, counts = self._rings(cx, cy)
+        order = np.argsort(rings, kind='stable')
+        covered = np.searchsorted(np.cumsum(counts[order]), needed)
+        return int(rings[order[min(covered, len(order) - 1)]])
+
+    def _distances(self, x, y, cx, cy, r, exclude):
+        positions = self._block(cx, cy, r)
+        dist = np.hypot(self.x[positions] - x, self.y[positions] - y)
+        if exclude is not None:
+            dist[self.ids[positions] == exclude] = np.inf
+        return positions, dist
+
+    def query(self, x, y, k=1, exclude=None):
+        """Ids of k points closest to (x, y) sorted by distance,
+        point with id `exclude` is skipped"""
+        cx, cy = (int(c) for c in self._cell(np.array(x), np.array(y)))
+        r = self._radius_covering(cx, cy, k + (exclude is not None))
+        positions, dist = self._distances(x, y, cx, cy, r, exclude)
+        # Points closer than k-th found one may lie in farther cells
+        kth = np.partition(dist, min(k, len(dist)) - 1)[min(k, len(dist)) - 1]
+        if np.isfinite(kth) and int(kth // self.cell_size) + 1 > r:
+            r = int(kth // self.cell_size) + 1
+            positions, dist = self._distances(x, y, cx, cy, r, exclude)
+        best = np.argsort(dist, kind='stable')[:k]
+        best = best[np.isfinite(dist[best])]
+        return self.ids[positions[best]]
+
+    def neighbors(self, k):
+        """Array of shape (N, k) with ids of k nearest points
+        for every indexed point, processed cell by cell"""
+        k = min(k, len(self.x) - 1)
+        result = np.empty((len(self.x), k), dtype=self.ids.dtype)
+        for (cx, cy), members in self.cells.items():
+            r = self._radius_covering(cx, cy, k + 1)
+            positions = self._block(cx, cy, r)
+            # Members in chunks, so crowded cells don't need huge matrices
+            step = max(MAX_PAIRS // len(positions), 1)
+            for start in range(0, len(members), step):
+                chunk = members[start:start + step]
+                result[chunk] = self._nearest(chunk, cx, cy, r, positions, k)
+        return result
+
+    def _nearest(self, members, cx, cy, r, positions, k):
+        """Ids of k nearest points of each member of cell (cx, cy),
+        block of radius r around it is widened when needed"""
+        dist = self._pair_distances(members, positions)
+        kth = np.partition(dist, k - 1, axis=1)[:, k - 1].max() if k else 0.0
+        r_needed = int(kth // self.cell_size) + 1
+        if r_needed > r:
+            positions = self._block(cx, cy, r_needed)
+            dist = self._pair_distances(members, positions)
+        best = np.argsort(dist, axis=1, kind='stable')[:, :k]
+        return self.ids[positions[best]]
+
+    def _pair_distances(self, members, positions):
+        dist = np.hypot(self.x[members, None] - self.x[positions],
+                        self.y[members, None] - self.y[positions])
+        dist[members[:, None] == positions] = np.inf
+        return dist
+
+    def insert(self, x, y, point_id):
+        """Add point, whole grid is rebuilt only
+        when the point lies outside of it"""
+        self.x = np.append(self.x, float(x))
+        self.y = np.append(self.y, float(y))
+        self.ids = np.append(self.ids, point_id)
+        position = len(self.x) - 1
+        cell = self._cell_of(position)
+        if not (0 <= cell[0] < self.nx and 0 <= cell[1] < self.ny):
+            self._build_grid()
+            return
+        members = self.cells.get(cell)
+        self.cells[cell] = (np.array([position]) if members is None
+                            else np.append(members, position))
+        self._occupied = None
+
+    def swap_remove(self, position):
+        """Remove point moving last point into its position,
+        moved point keeps its id"""
+        last = len(self.x) - 1
+        cell = self._cell_of(position)
+        members = self.cells[cell][self.cells[cell] != position]
+        if len(members):
+            self.cells[cell] = members
+        else:
+            del self.cells[cell]
+        self._occupied = None
+        if position != last:
+            cell = self._cell_of(last)
+            members = self.cells[cell].copy()
+            members[members == last] = position
+            self.cells[cell] = members
+        for name in ('x', 'y', 'ids'):
+            column = getattr(self, name)
+            new = column[:last].copy()
+            if position != last:
+                new[position] = column[last]
+            setattr(self, name, new)
@@ -0,0 +1,148 @@
+from collections.abc import Sequence
+from client import Client
+from drone import Drone
+import numpy as np
+
+
+class ClientView(Client):
+    """Client backed by one row of ClientStore"""
+    __slots__ = ('_store', '_idx')
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+
+    @property
+    def id(self):
+        return self._store.ids[self._idx].item()
+
+    @property
+    def x(self):
+        return self._store.x[self._idx].item()
+
+    @property
+    def y(self):
+        return self._store.y[self._idx].item()
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class ClientStore(Sequence):
+    """Columnar storage of clients
+    ids: Identifiers
+    x, y: Coordinates
+    Indexing returns lightweight ClientView objects"""
+    __slots__ = ('ids', 'x', 'y')
+
+    def __init__(self, ids, x, y):
+        self.ids = np.asarray(ids)
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+
+    @classmethod
+    def from_array(cls, array):
+        """Create store from array of rows: id, x, y"""
+        return cls(array[:, 0], array[:, 1], array[:, 2])
+
+    def __repr__(self):
+        return f'ClientStore({len(self)} clients)'
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return ClientStore(self.ids[idx], self.x[idx], self.y[idx])
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('client index out of range')
+        return ClientView(self, idx)
+
+    def coords(self, base=None):
+        """Array of (x, y) coordinates, optionally
+        preceded by base coordinates"""
+        coords = np.column_stack((self.x, self.y))
+        if base is not None:
+            coords = np.vstack(((base.x, base.y), coords))
+        return coords
+
+    def append(self, client_id, x, y):
+        """Add client at the end, columns are copied"""
+        self.ids = np.append(self.ids, client_id)
+        self.x = np.append(self.x, x)
+        self.y = np.append(self.y, y)
+
+    def swap_remove(self, idx):
+        """Remove client at idx moving last client into its place,
+        columns are copied so shared arrays stay untouched"""
+        last = len(self) - 1
+        for name in self.__slots__:
+            column = getattr(self, name)
+            new = column[:last].copy()
+            if idx != last:
+                new[idx] = column[last]
+            setattr(self, name, new)
+
+
+class DroneView(Drone):
+    """Drone whose capacity and position live in FleetStore"""
+    __slots__ = ('_fleet', '_idx')
+
+    def __init__(self, fleet, idx):
+        self._fleet = fleet
+        self._idx = idx
+        self.num_of_packages = 0
+        self.temp_client_id = None
+        self.x_client, self.y_client = None, None
+        self.x_prev_client, self.y_prev_client = None, None
+
+    @property
+    def id(self):
+        return self._fleet.ids[self._idx].item()
+
+    @property
+    def capacity(self):
+        return self._fleet.capacity[self._idx].item()
+
+    @property
+    def x(self):
+        return self._fleet.x[self._idx].item()
+
+    @x.setter
+    def x(self, value):
+        self._fleet.x[self._idx] = value
+
+    @property
+    def y(self):
+        return self._fleet.y[self._idx].item()
+
+    @y.setter
+    def y(self, value):
+        self._fleet.y[self._idx] = value
+
+
+class FleetStore(Sequence):
+    """Columnar storage of drones
+    ids: Identifiers
+    capacity: Capacity of each drone
+    x, y: Current positions
+    Views are created once, so they can be used as dict keys"""
+    __slots__ = ('ids', 'capacity', 'x', 'y', '_views')
+
+    def __init__(self, num_of_drones, drone_capacity):
+        self.ids = np.arange(1, num_of_drones + 1)
+        self.capacity = np.full(num_of_drones, drone_capacity)
+        self.x = np.zeros(num_of_drones)
+        self.y = np.zeros(num_of_drones)
+        self._views = [DroneView(self, i) for i in range(num_of_drones)]
+
+    def __repr__(self):
+        return repr(self._views)
+
+    def __len__(self):
+        return len(self._views)
+
+    def __getitem__(self, idx):
+        return self._views[idx]
@@ -0,0 +1,86 @@
+from collections import Counter, defaultdict
+
+
+class TabuList:
+    """Tabu memory storing iteration at which each move expires
+    tenure: Number of iterations a move stays tabu
+    frequency: Long-term memory counting how many times
+               each move was made (for diversification)
+    Adding, checking and expiring moves cost amortized O(1)"""
+    def __init__(self, tenure=50, frequency=True):
+        self.tenure = tenure
+        self.iteration = 0
+        self.expiry = {}
+        self.expiring = defaultdict(list)
+        self.frequency = Counter() if frequency else None
+
+    @classmethod
+    def from_state(cls, expiry, iteration, tenure, frequency=None):
+        """Tabu memory restored from saved expiry iterations
+        and frequency counts (None - no long-term memory)"""
+        tabu = cls(tenure, frequency is not None)
+        tabu.iteration = iteration
+        tabu.expiry = dict(expiry)
+        for key, expires in tabu.expiry.items():
+            tabu.expiring[expires].append(key)
+        if frequency is not None:
+            tabu.frequency.update(frequency)
+        return tabu
+
+    def __repr__(self):
+        return f'TabuList({len(self)} moves, tenure: {self.tenure})'
+
+    def __contains__(self, key):
+        return self.expiry.get(key, 0) > self.iteration
+
+    def __len__(self):
+        return len(self.expiry)
+
+    def __iter__(self):
+        return iter(self.expiry)
+
+    def add(self, key):
+        """Make move tabu for next `tenure` iterations"""
+        expires = self.iteration + self.tenure + 1
+        self.expiry[key] = expires
+        self.expiring[expires].append(key)
+        if self.frequency is not None:
+            self.frequency[key] += 1
+
+    def step(self):
+        """Advance to next iteration and forget expired moves"""
+        self.iteration += 1
+        for key in self.expiring.pop(self.iteration, ()):
+            # Move could have been added again with later expiry
+            if self.expiry.get(key) == self.iteration:
+                del self.expiry[key]
+
+    def penalty(self, key):
+        """Number of times the move was made so far"""
+        return self.frequency[key] if self.frequency is not None else 0
+
+    def relabel(self, func):
+        """Rename every key with func, keys renamed
+        to None are forgotten"""
+        expiry = {}
+        for key, expires in self.expiry.items():
+            new = func(key)
+            if new is not None:
+                expiry[new] = max(expires, expiry.get(new, 0))
+        self.expiry = expiry
+        self.expiring = defaultdict(list)
+        for key, expires in expiry.items():
+            self.expiring[expires].append(key)
+        if self.frequency is not None:
+            frequency = Counter()
+            for key, count in self.frequency.items():
+                new = func(key)
+                if new is not None:
+                    frequency[new] += count
+            self.frequency = frequency
+
+    def clear(self):
+        self.expiry.clear()
+        self.expiring.clear()
+        if self.frequency is not None:
+            self.frequency.clear()
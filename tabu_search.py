@@ -1,73 +1,120 @@
 from utils import with_timer
 from client import Client
-from drone import Drone
+from store import ClientStore, FleetStore
+from moves import (SWAP, RELOCATE, TWO_OPT_STAR, CROSS, move_delta, move_key,
+                   apply_move, relabel_key, route_deltas, route_loads)
+from scheduling import FleetSchedule
+from batch import CODES, MoveBatch, encode_solution, route_prefixes, select_move
+from adaptive import OperatorSelector, BEST, IMPROVED, ACCEPTED
+from tabu import TabuList
+from checkpoint import save_checkpoint, read_checkpoint
+from spatial import GridIndex
+from route_optimizer import optimize_route
+from instance_io import read_clients
+from distances import build_distance_matrix, cached_distance_matrix
 import numpy as np
 import random
+import warnings
+from itertools import combinations
+from time import monotonic
 MAX_COST = 999999
 
 class TabuSearch:
     
     def __init__(self, num_of_drones=3, drone_capacity=4,
-                 num_of_clients=12, clients_file=None):
+                 num_of_clients=12, clients_file=None,
+                 dtype=np.float64, cache_dir=None,
+                 clients=None, distance_matrix=None, spatial_index=None):
+        """num_of_drones: Size of fleet flying the routes one after
+                       another, None - one drone per route
+        dtype: Distance matrix precision, np.float32 halves memory
+        cache_dir: Directory for memory-mapped distance matrices
+                   of clients files, None disables caching
+        clients: Prepared ClientStore used instead of clients file
+        distance_matrix: Prepared distance matrix of clients
+        spatial_index: Prepared GridIndex of clients"""
         self.BASE = Client(0, 0, 0)
         self.M = num_of_drones
         self.Q = drone_capacity
         self.N = num_of_clients
         
         # D - number of routes needed to deliver packages
-        self.drones, self.D = self._create_drones(num_of_clients, drone_capacity)
-        self.clients = self._initialize_clients(clients_file, num_of_clients)
-        self.distance_matrix = self._create_distance_matrix()
-        self.TABU = {}
+        self.D = self._count_routes(num_of_clients, drone_capacity)
+        if self.M is None:
+            self.M = self.D
+        self.drones = FleetStore(self.M, drone_capacity)
+        # Minutes spent at every point of route, drone takes
+        # one minute to get next point assigned in simulation
+        self.stop_time = 1
+        if clients is None:
+            clients = self._initialize_clients(clients_file, num_of_clients)
+        self.clients = clients
+        if distance_matrix is None:
+            distance_matrix = self._create_distance_matrix(clients_file, dtype, cache_dir)
+        self.distance_matrix = distance_matrix
+        if spatial_index is None:
+            spatial_index = GridIndex(self.clients.x, self.clients.y, self.clients.ids)
+        self.spatial_index = spatial_index
+        self.neighbor_lists = {}
+        # Distance matrix with spare rows and columns for added clients
+        self._matrix_buffer = None
+        # SearchMetrics instance collecting instrumentation of search
+        self.metrics = None
+        self.TABU = TabuList()
+        # OperatorSelector of last search with adaptive operators
+        self.selector = None
         self.best_solution = None
         self.best_candidate = None
         self.candidate_cost = 0
         self.best_cost = 0
+        self.route_costs = []
+        # Cumulative distances along routes and fleet schedule of
+        # best candidate, kept only when objective includes makespan
+        self.route_prefix = None
+        self.schedule = None
+        # Best solution with drone of each of its routes
+        self.best_assignment = None
+        self.makespan_weight = 0.0
         self.processed_solution = {}
         self.costs = []
         self.best_costs = []
+        # Search loop state of loaded checkpoint, used by resume()
+        self.checkpoint_state = None
         
     def __repr__(self):
         return f'Tabu search for:\n\nClients: {self.clients}\n\nDrones: {self.drones}\n\nSolution: {self.solution}'
     
     @staticmethod
-    def _create_drones(num_of_clients, drone_capacity):
-        drones_needed = num_of_clients // drone_capacity
-        if num_of_clients % drone_capacity == 0:
-            drones = [Drone(i+1, drone_capacity) for i in range(drones_needed)]
-        else:
-            drones_needed += 1
-            drones = [Drone(i+1, drone_capacity) for i in range(drones_needed)]
-        return drones, drones_needed
+    def _count_routes(num_of_clients, drone_capacity):
+        routes_needed = num_of_clients // drone_capacity
+        if num_of_clients % drone_capacity != 0:
+            routes_needed += 1
+        return routes_needed
     
     @staticmethod
     def _read_clients_from_file(file_name, num_of_clients):
-        test_clients = np.loadtxt(file_name, delimiter=',', dtype=int)
-        if len(test_clients) > num_of_clients:
-            clients = [Client(*test_clients[i]) for i in range(num_of_clients)]
-        else:
-            clients = [Client(*c) for c in test_clients]
-        return clients
+        return read_clients(file_name, num_of_clients)
     
     @staticmethod
     def _create_new_client_samples(file_name, num_of_clients):
-        clients, busy = [], set()
+        clients, busy = np.zeros((num_of_clients, 3), dtype=int), set()
         with open(file_name, 'w') as file:
             for i in range(num_of_clients):
                 x_pos, y_pos = 0, 0
-                while y_pos == 0 and x_pos == 0 and (x_pos, y_pos) not in busy:
+                while (x_pos, y_pos) == (0, 0) or (x_pos, y_pos) in busy:
                     x_pos = random.randint(-35, 35)
                     y_pos = random.randint(-35, 35)
                 busy.add((x_pos, y_pos))
                 file.write(f'{i+1},{x_pos},{y_pos}\n')
-                clients.append(Client(i+1, x_pos, y_pos))
-        return clients
+                clients[i] = i+1, x_pos, y_pos
+        return ClientStore.from_array(clients)
     
     def _initialize_clients(self, file_name, num_of_clients):
         if file_name:
             try:
                 clients = self._read_clients_from_file(file_name, num_of_clients)
-            except OSError:
+            except FileNotFoundError:
+                warnings.warn(f'{file_name} not found, writing new random client samples to it')
                 return self._create_new_client_samples(file_name, num_of_clients)
             if len(clients) < self.N:
                 raise Exception('Not enough samples in the file:\
@@ -75,29 +122,29 @@ class TabuSearch:
             return clients
         return self._create_new_client_samples("test_clients.txt", num_of_clients)
     
-    def _create_distance_matrix(self):
-        distance_matrix = np.zeros((self.N + 1, self.N + 1))
-        for i in range(self.N + 1):
-            for j in range(i, self.N + 1):
-                if i != j:
-                    if i == 0:
-                        distance_matrix[i][j] = distance_matrix[j][i]\
-                        = self.clients[j-1].get_distance_from(self.BASE)
-                    else:
-                        distance_matrix[i][j] = distance_matrix[j][i]\
-                        = self.clients[i-1].get_distance_from(self.clients[j-1])
-        return distance_matrix
+    def _create_distance_matrix(self, file_name=None, dtype=np.float64, cache_dir=None):
+        coords = self.clients.coords(self.BASE)
+        if file_name and cache_dir:
+            return cached_distance_matrix(file_name, coords, dtype, cache_dir)
+        return build_distance_matrix(coords, dtype)
     
+    def path_duration(self, path):
+        """Minutes drone needs to fly ids of path (starting in base)"""
+        if len(path) <= 2 and not any(path):
+            return 0.0
+        return self.route_fitness(path) + self.stop_time * (len(path) - 1)
+
     def find_next_drone_to_come_back(self, paths):
+        """Index of drone which comes back to base first after flying
+        its path (drone -> list of points), idle drones come first"""
         lowest, idx = np.inf, 0
         for i, d in enumerate(self.drones):
-            if d not in paths:
-                break
-            s = sum(self.distance_matrix[paths[d][i].id][paths[d][i+1].id] \
-                    for i in range(len(paths[d])-1))
-            if s <= lowest:
+            if not paths.get(d):
+                return i
+            duration = self.path_duration([p.id for p in paths[d]])
+            if duration < lowest:
                 idx = i
-                lowest = s
+                lowest = duration
         return idx
     
     def generate_random_solution(self):
@@ -109,12 +156,12 @@ class TabuSearch:
         number of drones necessary to deliver all the packages
         (limited capacity)"""
         paths = [[0] for _ in range(self.D)]
-        samps = random.sample(self.clients, k=len(self.clients))
+        samps = random.sample(self.clients.ids.tolist(), k=len(self.clients))
         for p in paths:
             if len(samps) > self.Q:
-                p.extend([samps.pop().id for _ in range(self.Q)])
+                p.extend([samps.pop() for _ in range(self.Q)])
             else:
-                p.extend([samps.pop().id for _ in range(len(samps))])
+                p.extend([samps.pop() for _ in range(len(samps))])
             p.append(0)
         return paths
     
@@ -126,52 +173,171 @@ class TabuSearch:
     def route_fitness(self, route):
         return sum(self.distance_matrix[route[i]][route[i+1]] for i in range(len(route)-1))
     
-    def sort_route(self, route):
-        """Sorts route by searching permutations and finding
-        the most optimal (with least cost)
-        # NOTE: it may be unefficient when route consist
-                of more than 6 clients"""
-        r = route
-        best_fitness = self.route_fitness(r)
-        for perm in list(itertools.permutations(r[1:-1])):
-            perm = list(perm)
-            perm.insert(0, route[0])
-            perm.append(route[-1])
-            temp_fitness = self.route_fitness(perm)
-            if best_fitness > temp_fitness:
-                best_fitness = temp_fitness
-                r = perm
-        return r
+    def sort_route(self, route, strategy='auto'):
+        """Sorts route with intra-route optimizer:
+        exact Held-Karp for short routes, 2-opt and Or-opt
+        local search for longer ones (see route_optimizer)"""
+        return optimize_route(self.distance_matrix, route, strategy)
     
-    def sort_solution(self, solution):
+    def sort_solution(self, solution, strategy='auto'):
         """Sorts solution by sorting each route"""
-        return [self.sort_route(r) for r in solution]
+        return [self.sort_route(r, strategy) for r in solution]
     
     def find_closest_client(self, client):
         """Finds closest neighbor to passed client"""
-        min_ = MAX_COST
-        for c in self.clients:
-            if c != self.BASE and c != client:
-                dist_ = self.distance_matrix[client.id][c.id]
-                if dist_ < min_:
-                    client = c
-                    min_ = dist_
-        return client
-
-    def find_neighborhood(self):
-        """Generate each neighbor by randomly swapping
+        closest = self.spatial_index.query(client.x, client.y, k=1, exclude=client.id)
+        if len(closest) == 0 or self.distance_matrix[client.id, closest[0]] >= MAX_COST:
+            return client
+        return self.clients[closest[0]-1]
+
+    def nearest_neighbors(self, k):
+        """Ids of k closest clients for every client,
+        row i belongs to client with id i+1"""
+        if k not in self.neighbor_lists:
+            self.neighbor_lists[k] = self.spatial_index.neighbors(k)
+        return self.neighbor_lists[k]
+
+    def _random_move(self, kind, id_1, id_2, max_segment=2):
+        """Move of given kind between routes id_1 and id_2 at random
+        positions, None when route sizes or capacity don't allow it"""
+        n1 = len(self.best_candidate[id_1]) - 2
+        n2 = len(self.best_candidate[id_2]) - 2
+        if kind == RELOCATE:
+            if n1 == 0 or n2 >= self.Q:
+                return None
+            return (RELOCATE, id_1, np.random.randint(1, n1+1), id_2, np.random.randint(1, n2+2))
+        if kind == TWO_OPT_STAR:
+            samp_1 = np.random.randint(0, n1+1)
+            # Cuts leaving both routes within capacity
+            low, high = max(0, samp_1 + n2 - self.Q), min(n2, self.Q - n1 + samp_1)
+            if low > high:
+                return None
+            samp_2 = np.random.randint(low, high+1)
+            if (samp_1, samp_2) in ((0, 0), (n1, n2)):
+                return None
+            return (TWO_OPT_STAR, id_1, samp_1, id_2, samp_2)
+        if kind == CROSS:
+            if n1 == 0 or n2 == 0:
+                return None
+            len_1 = np.random.randint(1, min(max_segment, n1) + 1)
+            len_2 = np.random.randint(1, min(max_segment, n2) + 1)
+            if n1 - len_1 + len_2 > self.Q or n2 - len_2 + len_1 > self.Q:
+                return None
+            return (CROSS, id_1, np.random.randint(1, n1 - len_1 + 2),
+                    id_2, np.random.randint(1, n2 - len_2 + 2), len_1, len_2)
+        raise ValueError(f'Unknown move kind: {kind}')
+
+    def find_moves(self, kinds=(SWAP,), max_segment=2):
+        """Generate moves by randomly picking positions in
+        every two paths of best candidate, one move of each kind
+        per pair of paths (swap of the picked clients for SWAP)
+        kinds: Move kinds to generate, see moves.OPERATORS
+        max_segment: Longest segment exchanged by CROSS moves"""
+        return self.find_move_batch(kinds, max_segment).moves()
+
+    def find_move_batch(self, kinds=(SWAP,), max_segment=2):
+        """Moves of find_moves as MoveBatch, swap positions
+        of all pairs of paths are drawn at once"""
+        solution = self.best_candidate
+        lengths = np.fromiter(map(len, solution), dtype=np.intp, count=len(solution))[:self.D]
+        routes = np.flatnonzero(lengths > 2)
+        batches = []
+        if SWAP in kinds and len(routes):
+            # Single path can only swap its own clients
+            if len(routes) > 1:
+                first, second = np.triu_indices(len(routes), 1)
+                id_1, id_2 = routes[first], routes[second]
+            else:
+                id_1 = id_2 = routes
+            # Row after row, same draws as pair after pair
+            samp = np.random.randint(1, np.column_stack((lengths[id_1], lengths[id_2])) - 1)
+            batches.append(MoveBatch.of_kind(SWAP, id_1, samp[:, 0], id_2, samp[:, 1]))
+        other_kinds = [kind for kind in kinds if kind != SWAP]
+        if other_kinds:
+            moves = []
+            # Empty paths can still receive clients
+            for id_1, id_2 in combinations(range(self.D), 2):
+                if len(solution[id_1]) == 2 and len(solution[id_2]) == 2:
+                    continue
+                for kind in other_kinds:
+                    if np.random.randint(2):
+                        move = self._random_move(kind, id_2, id_1, max_segment)
+                    else:
+                        move = self._random_move(kind, id_1, id_2, max_segment)
+                    if move is not None:
+                        moves.append(move)
+            batches.append(MoveBatch.from_moves(moves))
+        return MoveBatch.concat(batches)
+
+    def find_granular_moves(self, num_neighbors=8, kinds=(SWAP, RELOCATE), max_segment=2):
+        """Generate moves only between geographically close clients,
+        each move makes a client adjacent to one of its nearest
+        neighbors from other paths: swap with client right before
+        or after the neighbor, relocation behind the neighbor,
+        exchange of tails or segments following client and
+        starting with neighbor - all within capacity
+        kinds: Move kinds to generate, see moves.OPERATORS
+        max_segment: Longest segment exchanged by CROSS moves"""
+        return self.find_granular_batch(num_neighbors, kinds, max_segment).moves()
+
+    def find_granular_batch(self, num_neighbors=8, kinds=(SWAP, RELOCATE), max_segment=2):
+        """Moves of find_granular_moves as MoveBatch, every pair of
+        client and neighbor has a slot for each possible move and
+        valid slots are taken pair after pair, in the same order"""
+        routes, lengths = encode_solution(self.best_candidate)
+        inner = np.arange(routes.shape[1]) < lengths[:, None] - 1
+        inner[:, 0] = False
+        route_of = np.zeros(self.N + 1, dtype=np.intp)
+        pos_of = np.zeros(self.N + 1, dtype=np.intp)
+        route_of[routes[inner]], pos_of[routes[inner]] = np.nonzero(inner)
+        neighbors = self.nearest_neighbors(num_neighbors)
+        client = np.repeat(self.clients.ids, neighbors.shape[1])
+        neighbor = neighbors.ravel()
+        id_1, id_2 = route_of[client], route_of[neighbor]
+        other = id_1 != id_2
+        id_1, id_2 = id_1[other], id_2[other]
+        samp_1, samp_2 = pos_of[client[other]], pos_of[neighbor[other]]
+        n1, n2 = lengths[id_1] - 2, lengths[id_2] - 2
+        swap, Q = SWAP in kinds, self.Q
+        # Slots: (kind, valid, samp_1, samp_2, len_1, len_2)
+        slots = []
+        if swap:
+            slots.append((SWAP, samp_2 > 1, samp_1, samp_2 - 1, 0, 0))
+            slots.append((SWAP, samp_2 < n2, samp_1, samp_2 + 1, 0, 0))
+        if RELOCATE in kinds:
+            slots.append((RELOCATE, n2 < Q, samp_1, samp_2 + 1, 0, 0))
+        if TWO_OPT_STAR in kinds:
+            slots.append((TWO_OPT_STAR, (samp_1 + n2 - samp_2 < Q) & (samp_2 + n1 - samp_1 <= Q + 1),
+                          samp_1, samp_2 - 1, 0, 0))
+        if CROSS in kinds:
+            for len_1 in range(1, max_segment + 1):
+                for len_2 in range(1, max_segment + 1):
+                    if swap and len_1 == len_2 == 1:
+                        continue
+                    valid = ((len_1 <= n1 - samp_1) & (len_2 <= n2 - samp_2 + 1)
+                             & (n1 - len_1 + len_2 <= Q) & (n2 - len_2 + len_1 <= Q))
+                    slots.append((CROSS, valid, samp_1 + 1, samp_2, len_1, len_2))
+        if not slots:
+            return MoveBatch([], [])
+        shape = (len(id_1), len(slots))
+        valid = np.column_stack([np.broadcast_to(slot[1], shape[:1]) for slot in slots])
+        pair, slot = np.nonzero(valid)
+        columns = [np.column_stack([np.broadcast_to(s[c], shape[:1]) for s in slots])[pair, slot]
+                   for c in range(2, 6)]
+        kind_codes = np.array([CODES[s[0]] for s in slots])
+        return MoveBatch(kind_codes[slot], np.column_stack(
+            (id_1[pair], columns[0], id_2[pair], columns[1], columns[2], columns[3])))
+
+    def _neighborhood_batch(self, neighborhood, num_neighbors, kinds=None):
+        if neighborhood == 'granular':
+            return self.find_granular_batch(num_neighbors, kinds or (SWAP, RELOCATE))
+        return self.find_move_batch(kinds or (SWAP,))
+
+    def find_neighborhood(self, kinds=(SWAP,)):
+        """Generate each neighbor by randomly changing
         only one client between every two paths from best candidate"""
-        solution = [path[:] for path in self.best_candidate]
-        neighborhood = []
-        moves = []
-        for id_1 in range(self.D):
-            for id_2 in range(id_1, self.D):
-                s_copy = [path[:] for path in solution]
-                samp_1 = np.random.randint(1,len(solution[id_1])-1)
-                samp_2 = np.random.randint(1,len(solution[id_2])-1)
-                s_copy[id_1][samp_1], s_copy[id_2][samp_2] = s_copy[id_2][samp_2], s_copy[id_1][samp_1]
-                moves.append((id_1, samp_1, id_2, samp_2))
-                neighborhood.append(s_copy)
+        moves = self.find_moves(kinds)
+        neighborhood = [apply_move(self.best_candidate, move) for move in moves]
         return neighborhood, moves
     
     def find_neighborhood2(self):
@@ -180,101 +346,553 @@ class TabuSearch:
         second with third and so on.. last paths swaps
         with first"""
         num_of_swaps = 3
-        solution = [path[:] for path in self.best_candidate]
+        solution = self.best_candidate
         neighborhood = []
         moves = []
         for _ in range(num_of_swaps):
-            for idx in self.D:
-                s_copy = [path[:] for path in solution]
-                samp_1 = samp_2 = 0
-                while samp_1 == samp_2:
-                    samp_1 = np.random.randint(1,len(solution[idx-1])-1)
-                    samp_2 = np.random.randint(1,len(solution[idx])-1)
-                s_copy[idx-1][samp_1], s_copy[idx][samp_2] = s_copy[idx][samp_2], s_copy[idx-1][samp_1]
-                moves.append((id_1, samp_1, id_2, samp_2))
-                neighborhood.append(s_copy)
+            for idx in range(self.D):
+                id_1, id_2 = (idx - 1) % self.D, idx
+                if id_1 == id_2 or len(solution[id_1]) == 2 or len(solution[id_2]) == 2:
+                    continue
+                samp_1 = np.random.randint(1,len(solution[id_1])-1)
+                samp_2 = np.random.randint(1,len(solution[id_2])-1)
+                move = (SWAP, id_1, samp_1, id_2, samp_2)
+                moves.append(move)
+                neighborhood.append(apply_move(solution, move))
         return neighborhood, moves
 
     def process_solution(self):
-        """Process solution which can be later visualized"""
-        for idx, path in enumerate(self.best_solution):
-            temp_path = []
-            for client_id in path:
-                if client_id == 0:
-                    temp_path.append(self.BASE)
-                else:
-                    temp_path.append(self.clients[client_id-1])
-            self.processed_solution[self.drones[idx]] = temp_path
+        """Process solution which can be later visualized:
+        routes are scheduled on the fleet (see scheduling) and routes
+        of each drone are joined into one path returning to base
+        between them, idle drones get empty path"""
+        assignment = None
+        if self.best_assignment is not None and self.best_assignment[0] is self.best_solution:
+            assignment = self.best_assignment[1]
+        schedule = FleetSchedule([self.path_duration(r) for r in self.best_solution],
+                                 self.M, assignment)
+        self.processed_solution = {}
+        for drone, trips in zip(self.drones, schedule.trips()):
+            path = []
+            for idx in trips:
+                route = self.best_solution[idx]
+                if len(route) == 2:
+                    continue
+                for client_id in route[1:] if path else route:
+                    if client_id == 0:
+                        path.append(self.BASE)
+                    else:
+                        path.append(self.clients[client_id-1])
+            self.processed_solution[drone] = path
     
     def initialize_solution(self, solution):
         """Initialize random solution"""
         self.best_candidate = solution
         self.best_solution = solution
-        self.best_cost = self._fitness(solution)
+        self.route_costs = [self.route_fitness(r) for r in solution]
+        self.best_cost = sum(self.route_costs)
         self.candidate_cost = self.best_cost
         self.costs.append(self.best_cost)
         self.best_costs.append(self.best_cost)
         self.processed_solution = {}
     
+    def _route_prefix(self, route):
+        route = np.asarray(route)
+        return np.concatenate(([0.0], np.cumsum(self.distance_matrix[route[:-1], route[1:]])))
+
+    def _objective(self):
+        """Cost of best candidate: total distance weighted
+        with makespan of its fleet schedule"""
+        distance = sum(self.route_costs)
+        if self.schedule is None:
+            return distance
+        w = self.makespan_weight
+        return (1 - w) * distance + w * self.schedule.makespan
+
+    def _start_schedule(self, makespan_weight):
+        """Track fleet schedule of best candidate
+        when objective includes makespan"""
+        self.makespan_weight = makespan_weight
+        if makespan_weight:
+            self.route_prefix = [self._route_prefix(r) for r in self.best_candidate]
+            self.schedule = FleetSchedule([self._trip_duration(idx)
+                                           for idx in range(len(self.best_candidate))], self.M)
+        else:
+            self.route_prefix = self.schedule = None
+        self.candidate_cost = self._objective()
+
+    def _trip_duration(self, idx):
+        """path_duration of route idx of best candidate from its cached cost"""
+        length = len(self.best_candidate[idx])
+        return self.route_costs[idx] + self.stop_time * (length - 1) if length > 2 else 0.0
+
+    def _update_routes(self, indices):
+        """Refresh cached costs of changed routes of best candidate"""
+        for idx in indices:
+            route = self.best_candidate[idx]
+            if self.route_prefix is None:
+                self.route_costs[idx] = self.route_fitness(route)
+            else:
+                self.route_prefix[idx] = self._route_prefix(route)
+                self.route_costs[idx] = self.route_prefix[idx][-1]
+        if self.schedule is None:
+            pass
+        elif len(self.schedule.durations) == len(self.best_candidate):
+            self.schedule.update_trips({idx: self._trip_duration(idx) for idx in indices})
+        else:
+            self.schedule.update([self._trip_duration(idx)
+                                  for idx in range(len(self.best_candidate))])
+        self.candidate_cost = self._objective()
+
+    def objective_delta(self, move):
+        """Change of objective made by the move, makespan change
+        is estimated with routes kept on their drones"""
+        if self.schedule is None:
+            return move_delta(self.distance_matrix, self.best_candidate, move)
+        solution, schedule, stop_time = self.best_candidate, self.schedule, self.stop_time
+        id_1, id_2 = move[1], move[3]
+        delta_1, delta_2 = route_deltas(self.distance_matrix, solution, self.route_prefix, move)
+        load_1, load_2 = route_loads(solution, move)
+        duration_1 = self.route_costs[id_1] + delta_1 + stop_time * (load_1 + 1) if load_1 else 0.0
+        if id_1 == id_2:
+            makespan = schedule.makespan_after(id_1, duration_1 - schedule.durations[id_1])
+        else:
+            duration_2 = self.route_costs[id_2] + delta_2 + stop_time * (load_2 + 1) if load_2 else 0.0
+            makespan = schedule.makespan_after(id_1, duration_1 - schedule.durations[id_1],
+                                               id_2, duration_2 - schedule.durations[id_2])
+        w = self.makespan_weight
+        return (1 - w) * (delta_1 + delta_2) + w * (makespan - schedule.makespan)
+
+    def batch_deltas(self, batch):
+        """objective_delta of every move of MoveBatch at once"""
+        dm, solution = self.distance_matrix, self.best_candidate
+        routes, lengths = encode_solution(solution)
+        if self.schedule is None:
+            return batch.deltas(dm, solution, routes)
+        schedule, stop_time = self.schedule, self.stop_time
+        id_1, id_2 = batch.fields[:, 0], batch.fields[:, 2]
+        delta_1, delta_2 = batch.route_deltas(dm, solution, routes, route_prefixes(dm, routes))
+        load_1, load_2 = batch.loads(lengths)
+        costs, durations = np.asarray(self.route_costs), np.asarray(schedule.durations)
+        duration_1 = np.where(load_1 > 0, costs[id_1] + delta_1 + stop_time * (load_1 + 1), 0.0)
+        duration_2 = np.where(load_2 > 0, costs[id_2] + delta_2 + stop_time * (load_2 + 1), 0.0)
+        makespan = schedule.makespans_after(id_1, duration_1 - durations[id_1], id_2,
+                                            np.where(id_1 == id_2, 0.0, duration_2 - durations[id_2]))
+        w = self.makespan_weight
+        return (1 - w) * (delta_1 + delta_2) + w * (makespan - schedule.makespan)
+
+    def _batch_key(self, batch, keys):
+        """Function returning tabu key of move of batch by index,
+        keys are kept in keys (index -> key)"""
+        solution = self.best_candidate
+
+        def key(i):
+            if i not in keys:
+                keys[i] = move_key(solution, batch.move(i))
+            return keys[i]
+        return key
+
+    def apply_move(self, move):
+        """Build best candidate from the winning move
+        and refresh cached costs of affected routes"""
+        id_1, id_2 = move[1], move[3]
+        self.best_candidate = apply_move(self.best_candidate, move)
+        self._update_routes({id_1, id_2})
+    
+    def sort_candidate_routes(self, move, strategy='auto'):
+        """Sort routes of best candidate affected by the move"""
+        id_1, id_2 = move[1], move[3]
+        self.best_candidate = self.best_candidate[:]
+        for idx in {id_1, id_2}:
+            self.best_candidate[idx] = self.sort_route(self.best_candidate[idx], strategy)
+        self._update_routes({id_1, id_2})
+    
+    def _reserve_matrix(self, size):
+        """Make distance matrix a view of size x size block of buffer
+        with spare rows and columns, so adding a client writes one row
+        and column instead of copying the whole matrix"""
+        buffer = self._matrix_buffer
+        if buffer is None or len(buffer) < size:
+            n = len(self.distance_matrix)
+            capacity = max(size, n + n // 2)
+            buffer = np.zeros((capacity, capacity), dtype=self.distance_matrix.dtype)
+            buffer[:n, :n] = self.distance_matrix
+            self._matrix_buffer = buffer
+        self.distance_matrix = buffer[:size, :size]
+
+    def _client_neighbors(self, client_id, k):
+        return self.spatial_index.query(self.clients.x[client_id-1], self.clients.y[client_id-1],
+                                        k, exclude=client_id)
+
+    def _update_neighbor_lists(self, added=None, removed=None, moved=None):
+        """Recompute only rows of cached neighbor lists changed by
+        added client or by removed client replaced with moved one"""
+        neighbor_lists = {}
+        for k, lists in self.neighbor_lists.items():
+            width = min(k, self.N - 1)
+            if width == 0 or lists.shape[1] != width:
+                # Too few clients for k neighbors, computed again when needed
+                continue
+            if added is not None:
+                ids = np.arange(1, added)
+                closer = self.distance_matrix[ids, added] < self.distance_matrix[ids, lists[:, -1]]
+                lists = np.vstack((lists, self._client_neighbors(added, width)))
+                stale = np.append(closer, False)
+            else:
+                stale = (lists == removed).any(axis=1)
+                lists = lists.copy()
+                lists[lists == moved] = removed
+                lists[removed-1], stale[removed-1] = lists[moved-1], stale[moved-1]
+                lists, stale = lists[:self.N], stale[:self.N]
+            for row in np.flatnonzero(stale).tolist():
+                lists[row] = self._client_neighbors(row + 1, width)
+            neighbor_lists[k] = lists
+        self.neighbor_lists = neighbor_lists
+
+    def _cheapest_insertion(self, client_id):
+        """Route and position where client adds least distance,
+        only routes with spare capacity are considered"""
+        dm = self.distance_matrix
+        best, best_delta = (None, None), np.inf
+        for idx, route in enumerate(self.best_solution):
+            if len(route) - 2 >= self.Q:
+                continue
+            route = np.asarray(route)
+            deltas = dm[route[:-1], client_id] + dm[client_id, route[1:]] - dm[route[:-1], route[1:]]
+            pos = int(np.argmin(deltas))
+            if deltas[pos] < best_delta:
+                best, best_delta = (idx, pos + 1), deltas[pos]
+        return best
+
+    def _set_solution(self, solution, changed):
+        """Make edited solution the starting point of next warm search"""
+        if self.best_candidate is not self.best_solution or len(solution) != len(self.route_costs):
+            changed = range(len(solution))
+            self.route_costs = [0.0] * len(solution)
+            if self.route_prefix is not None:
+                self.route_prefix = [None] * len(solution)
+        self.best_solution = self.best_candidate = solution
+        self._update_routes(changed)
+        self.best_cost = self.candidate_cost
+        self.process_solution()
+
+    def add_client(self, x, y):
+        """Add client at (x, y) to live instance, returns its id.
+        Distance matrix grows by one row and column, the client is
+        inserted into best solution at the cheapest position of route
+        with spare capacity (new route is opened when all are full).
+        Continue with search(warm_start=True)"""
+        client_id = self.N + 1
+        coords = self.clients.coords(self.BASE)
+        dist = np.hypot(coords[:, 0] - x, coords[:, 1] - y)
+        if not dist.all():
+            raise ValueError(f'Coordinates ({x}, {y}) already taken by base or another client')
+        self._reserve_matrix(client_id + 1)
+        self.distance_matrix[client_id, :client_id] = dist
+        self.distance_matrix[:client_id, client_id] = dist
+        self.distance_matrix[client_id, client_id] = 0
+        self.clients.append(client_id, x, y)
+        self.spatial_index.insert(x, y, client_id)
+        self.N = client_id
+        self._update_neighbor_lists(added=client_id)
+
+        if self.best_solution is None:
+            self.D = self._count_routes(self.N, self.Q)
+            return client_id
+        idx, pos = self._cheapest_insertion(client_id)
+        solution = self.best_solution[:]
+        if idx is None:
+            idx = len(solution)
+            solution.append([0, client_id, 0])
+            self.D += 1
+        else:
+            solution[idx] = solution[idx][:]
+            solution[idx].insert(pos, client_id)
+        self._set_solution(solution, [idx])
+        return client_id
+
+    def remove_client(self, client_id):
+        """Remove client from live instance. Last client takes over
+        its id, so ids stay equal to row numbers, and routes, tabu
+        memory and neighbor lists are relabeled accordingly.
+        Emptied routes are kept for clients added later.
+        Continue with search(warm_start=True)"""
+        if not 1 <= client_id <= self.N:
+            raise ValueError(f'No client with id {client_id}')
+        if self.N == 1:
+            raise ValueError('Cannot remove the only client')
+        last = self.N
+        self._reserve_matrix(last + 1)
+        dm = self._matrix_buffer
+        if client_id != last:
+            dm[client_id, :last+1] = dm[last, :last+1]
+            dm[:last+1, client_id] = dm[:last+1, last]
+            dm[client_id, client_id] = 0
+        self._reserve_matrix(last)
+        self.clients.swap_remove(client_id - 1)
+        self.spatial_index.swap_remove(client_id - 1)
+        if client_id != last:
+            self.clients.ids[client_id-1] = client_id
+            self.spatial_index.ids[client_id-1] = client_id
+        self.N = last - 1
+        self._update_neighbor_lists(removed=client_id, moved=last)
+
+        mapping = {client_id: None} if client_id == last else {client_id: None, last: client_id}
+        self.TABU.relabel(lambda key: relabel_key(key, mapping))
+        if self.best_solution is None:
+            self.D = self._count_routes(self.N, self.Q)
+            return
+        solution, changed = self.best_solution[:], []
+        for idx, route in enumerate(solution):
+            if client_id in route or last in route:
+                solution[idx] = [client_id if c == last else c for c in route if c != client_id]
+                changed.append(idx)
+        self._set_solution(solution, changed)
+
+    @classmethod
+    def from_checkpoint(cls, file_name, **kwargs):
+        """Search restored from checkpoint file (see search_iter),
+        resume() continues it exactly where it was saved
+        kwargs: Passed to constructor (dtype, distance_matrix, ...)"""
+        data = read_checkpoint(file_name)
+        meta = data['meta']
+        # Deltas match the saved run only in its precision
+        kwargs.setdefault('dtype', np.dtype(meta['dtype']))
+        ts = cls(meta['M'], meta['Q'], meta['N'],
+                 clients=ClientStore.from_array(data['clients']), **kwargs)
+        ts.D = meta['D']
+        ts.stop_time = meta['stop_time']
+        ts.best_solution = data['solution']
+        ts.best_candidate = data.get('candidate', ts.best_solution)
+        ts.route_costs = data['route_costs'].tolist()
+        ts.best_cost = meta['best_cost']
+        ts.costs = data['costs'].tolist()
+        ts.best_costs = data['best_costs'].tolist()
+        tabu = meta['tabu']
+        ts.TABU = TabuList.from_state(data['tabu'], tabu['iteration'], tabu['tenure'],
+                                      data.get('frequency'))
+        ts.makespan_weight = meta['makespan_weight']
+        if 'schedule_assignment' in data:
+            ts.route_prefix = [ts._route_prefix(r) for r in ts.best_candidate]
+            ts.schedule = FleetSchedule.from_state(
+                [ts._trip_duration(idx) for idx in range(len(ts.best_candidate))], ts.M,
+                data['schedule_assignment'].tolist(), data['schedule_loads'].tolist(),
+                meta['schedule_updates'])
+        if 'best_assignment' in data:
+            ts.best_assignment = (ts.best_solution, data['best_assignment'].tolist())
+        ts.candidate_cost = ts._objective()
+        selector = meta.get('selector')
+        if selector is not None:
+            ops = selector['operators']
+            ts.selector = OperatorSelector(ops, selector['reaction'], selector['segment'],
+                                           selector['min_weight'], selector['rewards'])
+            ts.selector.iteration = selector['iteration']
+            ts.selector.weights = dict(zip(ops, data['selector_weights'].tolist()))
+            ts.selector.scores = dict(zip(ops, data['selector_scores'].tolist()))
+            ts.selector.uses = dict(zip(ops, data['selector_uses'].tolist()))
+            ts.selector.total_uses.update(
+                {op: n for op, n in zip(ops, data['selector_total_uses'].tolist()) if n})
+        random.setstate(data['random_state'])
+        np.random.set_state(data['np_random_state'])
+        ts.checkpoint_state = meta['state']
+        return ts
+
+    def resume(self, callback=None, **kwargs):
+        """Continue search of loaded checkpoint with its saved
+        parameters, kwargs override them (e.g. larger n_iters)"""
+        if self.checkpoint_state is None:
+            raise ValueError('No checkpoint loaded, use TabuSearch.from_checkpoint')
+        params = {**self.checkpoint_state['params'], **kwargs}
+        self.search(callback=callback, resume=True, **params)
+
     @with_timer
-    def search(self, tabu_size=50, n_iters=1000):
-        """Main search loop
-        1. Create and initialize random solution
-        2. Iterate over neighbors and search for best candidate,
+    def search(self, tabu_size=50, n_iters=1000, callback=None, **kwargs):
+        """Run search until it stops, see search_iter for parameters
+        callback: Called with (iteration, best_cost, best_solution)
+                  on every improvement, returning False stops search"""
+        improvements = self.search_iter(tabu_size, n_iters, **kwargs)
+        try:
+            for improvement in improvements:
+                if callback is not None and callback(*improvement) is False:
+                    break
+        finally:
+            improvements.close()
+    
+    def search_iter(self, tabu_size=50, n_iters=1000, neighborhood='random', num_neighbors=8,
+                    sort_candidates=None, frequency_penalty=0.0,
+                    time_budget=None, stagnation=None, warm_start=False, operators=None,
+                    makespan_weight=0.0, checkpoint=None, checkpoint_every=100, resume=False):
+        """Main search loop, yields (iteration, best_cost, best_solution)
+        for initial solution and whenever best solution improves,
+        so it can be used before search ends (anytime search)
+        1. Create and initialize random solution (or continue
+           from best solution and tabu memory when warm_start)
+        2. Iterate over moves and search for best candidate,
            save it if move not in tabu list
         3. If move in tabu list check aspiration criteria
         4. If best candidate's cost function is less than best known
            solution then save it
         5. Add candidate's move to tabu list
-        6. If tabu list length is > max tabu size then remove
-           the first one in the list"""
-        sol = self.generate_random_solution()
-        self.initialize_solution(sol)  
-        temp_move = None
+        6. Forget moves which stayed in tabu list for tabu_size iterations
+        Neighbors are scored by cost deltas of the affected edges,
+        whole neighborhood at once (see batch), only the winning
+        move is turned into a full solution.
+        Search stops after n_iters iterations (None - no limit),
+        time_budget seconds or stagnation iterations without improvement
+        whichever comes first, or when caller stops iterating.
+        Solution is processed when search stops.
+        neighborhood: 'random' - one swap between every two paths,
+                      'granular' - moves between num_neighbors closest clients
+        operators: Move kinds (moves.OPERATORS) the neighborhood is built
+                   from, one of them chosen each iteration adaptively
+                   by recent success, None - swaps (and relocations
+                   in granular neighborhood) every iteration
+        sort_candidates: Strategy of intra-route optimizer applied to routes
+                         of every improving candidate, None disables it
+        frequency_penalty: Cost added to non-improving moves per each time
+                           the move was made before (diversification)
+        makespan_weight: Weight w of objective (1 - w) * total distance
+                         + w * makespan of routes scheduled on the fleet,
+                         0 - total distance only
+        checkpoint: File the search state is saved to every checkpoint_every
+                    iterations (checkpoint.save_checkpoint)
+        resume: Continue search state restored by from_checkpoint,
+                iterations are counted from start of saved search"""
+        params = {'tabu_size': tabu_size, 'n_iters': n_iters, 'neighborhood': neighborhood,
+                  'num_neighbors': num_neighbors, 'sort_candidates': sort_candidates,
+                  'frequency_penalty': frequency_penalty, 'time_budget': time_budget,
+                  'stagnation': stagnation, 'operators': operators,
+                  'makespan_weight': makespan_weight, 'checkpoint': checkpoint,
+                  'checkpoint_every': checkpoint_every}
+        if resume:
+            # Solution, tabu memory, schedule and selector were restored
+            state = self.checkpoint_state
+            iteration, last_improvement = state['iteration'], state['last_improvement']
+        else:
+            warm_start = warm_start and self.best_solution is not None
+            if warm_start:
+                if self.best_candidate is not self.best_solution:
+                    self.best_candidate = self.best_solution
+                    self.route_costs = [self.route_fitness(r) for r in self.best_solution]
+            else:
+                self.initialize_solution(self.generate_random_solution())
+            self._start_schedule(makespan_weight)
+            self.best_cost = self.candidate_cost
+            if self.schedule is not None:
+                self.best_assignment = (self.best_solution, self.schedule.assignment)
+            if not warm_start:
+                self.costs[-1] = self.best_costs[-1] = self.best_cost
+            self.selector = OperatorSelector(operators) if operators else None
+            iteration = last_improvement = 0
+        self.TABU.tenure = tabu_size
+        
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.start()
+        
+        deadline = None if time_budget is None else monotonic() + time_budget
+        try:
+            yield 0, self.best_cost, self.best_solution
         
-        while n_iters > 0:
-            nh, moves = self.find_neighborhood()
-            for nb, move in zip(nh, moves):
-                if move not in self.TABU:
-                    self.best_candidate = nb
-                    self.candidate_cost = self._fitness(self.best_candidate)
-                    temp_move = move
+            while n_iters is None or iteration < n_iters:
+                if deadline is not None and monotonic() >= deadline:
                     break
+                if stagnation is not None and iteration - last_improvement >= stagnation:
+                    break
+                iteration += 1
+                kind = None
+                fallback = False
+                if self.selector is not None:
+                    kind = self.selector.choose()
+                    batch = self._neighborhood_batch(neighborhood, num_neighbors, (kind,))
+                    if not len(batch):
+                        # Operator has no feasible move, fall back to all of them,
+                        # drawn operator is rewarded as if nothing was accepted
+                        fallback = True
+                        batch = self._neighborhood_batch(neighborhood, num_neighbors,
+                                                         self.selector.operators)
+                else:
+                    batch = self._neighborhood_batch(neighborhood, num_neighbors)
+                if metrics is not None:
+                    metrics.lap('neighborhood')
+                deltas = self.batch_deltas(batch)
+                # Tabu keys are built only for moves which are checked
+                keys = {}
+                key = self._batch_key(batch, keys)
+                # Tabu moves met by select_move, counted for metrics
+                tabu_moves = set()
+
+                def is_tabu(i):
+                    if key(i) in self.TABU:
+                        tabu_moves.add(i)
+                        return True
+                    return False
+                if frequency_penalty:
+                    penalized = np.flatnonzero(deltas >= 0).tolist()
+                    keys.update(zip(penalized, batch.keys(self.best_candidate, penalized)))
+                    penalties = np.zeros(len(batch))
+                    penalties[penalized] = [self.TABU.penalty(keys[i]) for i in penalized]
+                    scores = np.where(deltas >= 0, deltas + (frequency_penalty * penalties)
+                                      .astype(deltas.dtype), deltas)
+                else:
+                    scores = deltas
+                if metrics is not None:
+                    metrics.lap('evaluation')
+                base_cost = self.candidate_cost
+                # Aspiration criteria for tabu moves checked by select_move
+                best = select_move(scores, deltas, base_cost, self.best_cost, is_tabu)
+                if metrics is not None:
+                    aspiration = best is not None and key(best) in self.TABU
+                    tabu_hits = len(tabu_moves)
+                    metrics.lap('selection')
             
-            for nb, move  in zip(nh[1:], moves[1:]):
-                nb_cost = self._fitness(nb)
-                if nb_cost < self.candidate_cost:
-                    if move not in self.TABU:
-                        self.best_candidate = nb
-                        self.candidate_cost = nb_cost
-                        temp_move = move
-                    else:
-                        # Aspiration criteria
-                        if nb_cost < self.best_cost:
-                            self.best_candidate = nb
-                            self.candidate_cost = nb_cost
-                            temp_move = move
+                if best is not None:
+                    move = batch.move(best)
+                    self.apply_move(move)
+                    if sort_candidates and self.candidate_cost < self.best_cost:
+                        self.sort_candidate_routes(move, sort_candidates)
             
-            if self.candidate_cost < self.best_cost:
-                self.best_solution = self.best_candidate
-                self.best_cost = self.candidate_cost
+                improved = self.candidate_cost < self.best_cost
+                if self.selector is not None:
+                    if best is None or fallback:
+                        self.selector.reward(kind)
+                    else:
+                        outcome = (BEST if improved else IMPROVED
+                                   if self.candidate_cost < base_cost else ACCEPTED)
+                        self.selector.reward(move[0], outcome)
+                if improved:
+                    self.best_solution = self.best_candidate
+                    self.best_cost = self.candidate_cost
+                    if self.schedule is not None:
+                        self.best_assignment = (self.best_solution, self.schedule.assignment)
+                    last_improvement = iteration
+                    if metrics is not None:
+                        metrics.on_improvement(len(self.costs), self.best_cost)
+                if metrics is not None:
+                    metrics.lap('apply')
             
-            # Add candidate to tabu and update cost history
-            self.TABU[temp_move] = tabu_size
-            self.costs.append(self.candidate_cost)
-            self.best_costs.append(self.best_cost)
+                # Add made move to tabu (stalled iterations add nothing,
+                # so frequency counts only moves made) and update cost history
+                if best is not None:
+                    self.TABU.add(key(best))
+                self.costs.append(self.candidate_cost)
+                self.best_costs.append(self.best_cost)
             
-            # Remove moves from tabu list
-            moves_to_delete = []
-            for move, i in self.TABU.items():
-                if i == 0:
-                    moves_to_delete.append(move)
-                else:
-                    self.TABU[move] -= 1
-                    
-            for s in moves_to_delete:
-                del self.TABU[s]
+                # Forget expired moves
+                self.TABU.step()
             
-            n_iters -= 1
-    
-        self.process_solution()
\ No newline at end of file
+                if metrics is not None:
+                    metrics.on_iteration(len(self.costs) - 1, self.candidate_cost, self.best_cost,
+                                         len(batch), tabu_hits, aspiration)
+                    metrics.lap('tabu')
+                if checkpoint is not None and iteration % checkpoint_every == 0:
+                    save_checkpoint(self, checkpoint, {
+                        'iteration': iteration, 'last_improvement': last_improvement,
+                        'params': params})
+                if improved:
+                    yield iteration, self.best_cost, self.best_solution
+        finally:
+            self.process_solution()
+            if metrics is not None:
+                metrics.lap('process_solution')
+                metrics.on_finish()
\ No newline at end of file
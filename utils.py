@@ -3,7 +3,7 @@ from time import time
 
 def with_timer(func):
     """Print function runtime wrapper"""
-    wraps(func)
+    @wraps(func)
     def f(*args, **kwargs):
         before = time()
         rv = func(*args, **kwargs)
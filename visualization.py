@@ -1,10 +1,21 @@
 from matplotlib import pyplot as plt
+from matplotlib import animation
+from matplotlib import rcParams
+from itertools import chain
+import numpy as np
+import os
+import subprocess
+
+# Drones labeled separately in legend only for small fleets
+LEGEND_LIMIT = 20
 
 class WithVisualization:
     """
     drones: All available drones
     clients: Not visited clients
     x_visited, y_visited: Visited clients coords
+    x_drones, y_drones: Path of each drone, rows of preallocated
+                        buffers filled up to n_positions
     total_time: Total time passed since running visualization
     """
     def __init__(self, obj):
@@ -16,21 +27,25 @@ class WithVisualization:
         
         self.x_clients, self.y_clients = self._initialize_client_positions(obj.clients)
         self.x_visited, self.y_visited = [], []
-        self.x_drones, self.y_drones = [], []
+        self.x_drones = np.empty((len(self.drones), 64))
+        self.y_drones = np.empty((len(self.drones), 64))
+        self.n_positions = 0
+        self.animation = None
     
     @staticmethod
     def _initialize_client_positions(clients):
-        x_clients, y_clients = [], []
-        for c in clients:
-            x_clients.append(c.x)
-            y_clients.append(c.y)
-        return x_clients, y_clients
+        return clients.x.tolist(), clients.y.tolist()
     
     def update_drone_positions(self):
         """Drone path update"""
-        for drone in self.drones:
-            self.x_drones.append(drone.x)
-            self.y_drones.append(drone.y)
+        n = self.n_positions
+        if n == self.x_drones.shape[1]:
+            # Buffers grow by doubling, appending stays amortized O(1)
+            self.x_drones = np.concatenate((self.x_drones, np.empty_like(self.x_drones)), axis=1)
+            self.y_drones = np.concatenate((self.y_drones, np.empty_like(self.y_drones)), axis=1)
+        self.x_drones[:, n] = [drone.x for drone in self.drones]
+        self.y_drones[:, n] = [drone.y for drone in self.drones]
+        self.n_positions = n + 1
     
     def update_visited_clients(self, x, y):
         """Updating visited clients"""
@@ -56,52 +71,110 @@ class WithVisualization:
     def plot_figure(self, sizes=(12,12)):
         fig = plt.figure(figsize=sizes)
 
-    def visualize_solution(self):
-        """Run real time visualization"""
-        fig, ax = plt.subplots(figsize=(15, 15))
-        k, elapsed_time, D = 1, 0, len(self.drones)
-        delivered = False
+    def simulate_steps(self):
+        """Move drones minute by minute, yields elapsed time
+        after each minute until all packages are delivered"""
+        elapsed_time, delivered = 0, False
         while not delivered:
             delivered = True
-            k = 1 if k == 4 else k + 1
             for drone in self.drones:
                 if drone.temp_client_id == None:
                     is_assigned = self.assign_client(drone.id)
                     if is_assigned or drone.x != 0 or drone.y != 0:
                         delivered = False
-                    self.update_visited_clients(drone.x_prev_client, drone.y_prev_client)
+                    if is_assigned and drone.x_prev_client is not None:
+                        self.update_visited_clients(drone.x_prev_client, drone.y_prev_client)
                 else:
                     drone.travel(elapsed_time)
                     delivered = False
             elapsed_time += 1
+            self.total_time = elapsed_time
             self.update_drone_positions()
-            ax.plot(0, 0, 'bo', markersize=14, label="Base")
-            ax.plot(self.x_clients, self.y_clients, 'go', markersize=12, label="Receiver")
-            ax.plot(self.x_drones[-D:], self.y_drones[-D:], 'm{}'.format(k), markersize=24, markeredgewidth=3, label="Drone")
-            ax.plot(self.x_visited, self.y_visited, 'ro', markersize=12, label="Package delivered")
-            for s in range(D):
-                ax.plot(self.x_drones[s::D], self.y_drones[s::D], linewidth=3, label=f"(Drone: {s+1}, Packages: {self.drones[s].num_of_packages})")
-            ax.set_title(f'Actual time since start in minutes: {elapsed_time}')
-            ax.set_ylim(-40, 40)
-            ax.set_xlim(-40, 40)
-            ax.legend()
-            ax.grid()
-            fig.canvas.draw()
-            renderer = fig.canvas.renderer
-            ax.draw(renderer) 
-            plt.pause(0.01)
-            ax.cla()
+            yield elapsed_time
+
+    def _create_artists(self, ax):
+        """Create all plot elements once, frames only update their data"""
+        D = len(self.drones)
         ax.plot(0, 0, 'bo', markersize=14, label="Base")
         ax.plot(self.x_clients, self.y_clients, 'go', markersize=12, label="Receiver")
-        self.update_drone_positions()
-        for s in range(D):
-            ax.plot(self.x_drones[s::D], self.y_drones[s::D], linewidth=3, label=f"(Drone: {s+1}, Packages: {self.drones[s].num_of_packages})")
-        ax.set_title(f'Actual time since start in minutes: {elapsed_time}')
+        visited, = ax.plot([], [], 'ro', markersize=12, label="Package delivered", animated=True)
+        drones, = ax.plot([], [], 'm1', linestyle='none', markersize=24, markeredgewidth=3,
+                          label="Drone", animated=True)
+        trails = [ax.plot([], [], linewidth=3, animated=True,
+                          label=f"(Drone: {s+1})" if D <= LEGEND_LIMIT else None)[0]
+                  for s in range(D)]
+        time_text = ax.text(0.02, 0.97, '', transform=ax.transAxes, fontsize=14,
+                            verticalalignment='top', animated=True)
         ax.set_ylim(-40, 40)
         ax.set_xlim(-40, 40)
-        ax.legend()
+        ax.legend(loc='upper right')
         ax.grid()
-        plt.show()
+        return visited, drones, trails, time_text
+
+    def visualize_solution(self, output=None, fps=30, frame_step=1, interval=10, dpi=None):
+        """Run visualization of drones delivering packages.
+        Plot elements are created once and redrawn with blitting.
+        output: Video file (.mp4 or .gif) to render frames to
+                without opening a window (headless mode)
+        fps: Frames per second of saved video
+        frame_step: Draw every frame_step-th minute of simulation
+        interval: Delay between frames in window in milliseconds
+        dpi: Resolution of saved video, figure's dpi by default"""
+        fig, ax = plt.subplots(figsize=(15, 15), dpi=dpi)
+        visited, drones, trails, time_text = self._create_artists(ax)
+        artists = [visited, drones, time_text, *trails]
+        markers = ['1', '2', '3', '4']
+
+        def frames():
+            for elapsed_time in self.simulate_steps():
+                if elapsed_time % frame_step == 0:
+                    yield elapsed_time
+            if self.total_time % frame_step != 0:
+                yield self.total_time
+
+        def update(elapsed_time, trail_start=0):
+            """Set data of artists, trails from position trail_start"""
+            visited.set_data(self.x_visited, self.y_visited)
+            drones.set_data([d.x for d in self.drones], [d.y for d in self.drones])
+            drones.set_marker(markers[elapsed_time % len(markers)])
+            n = self.n_positions
+            for s, trail in enumerate(trails):
+                trail.set_data(self.x_drones[s, trail_start:n], self.y_drones[s, trail_start:n])
+            time_text.set_text(f'Actual time since start in minutes: {elapsed_time}')
+            return artists
+
+        if output is None:
+            self.animation = animation.FuncAnimation(
+                fig, update, frames=frames, init_func=lambda: artists, interval=interval,
+                blit=True, repeat=False, cache_frame_data=False)
+            plt.show()
+            return
+        try:
+            write_video(self._blit_frames(fig, ax, trails, [visited, drones, time_text],
+                                          frames(), update), output, fps)
+        finally:
+            plt.close(fig)
+
+    def _blit_frames(self, fig, ax, trails, artists, frames, update):
+        """Render frames off-screen: static background is drawn once,
+        each frame restores it and draws only animated artists.
+        Trails drawn so far are kept in background, so each frame
+        draws only their new segments and costs the same at any time"""
+        canvas = fig.canvas
+        canvas.draw()
+        background = canvas.copy_from_bbox(fig.bbox)
+        drawn = 0
+        for frame in frames:
+            canvas.restore_region(background)
+            # Segments start at last drawn position to stay connected
+            update(frame, max(drawn - 1, 0))
+            for trail in trails:
+                ax.draw_artist(trail)
+            background = canvas.copy_from_bbox(fig.bbox)
+            drawn = self.n_positions
+            for artist in artists:
+                ax.draw_artist(artist)
+            yield np.array(canvas.buffer_rgba())
     
     def plot_solution(self):
         """Plot final solution"""
@@ -115,4 +188,43 @@ class WithVisualization:
         plt.legend()
         plt.ylim(-40, 40)
         plt.xlim(-40, 40)
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+
+def write_video(frames, output, fps=30):
+    """Write RGBA frames to .gif (with Pillow) or
+    any video format supported by ffmpeg, e.g. .mp4"""
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return
+    height, width = first.shape[:2]
+    if os.path.splitext(output)[1].lower() == '.gif':
+        _write_gif(chain((first,), frames), output, fps)
+        return
+    command = [rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{width}x{height}',
+               '-r', str(fps), '-i', '-',
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', output]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+        process.stdin.write(first.tobytes())
+        for frame in frames:
+            process.stdin.write(frame.tobytes())
+        process.stdin.close()
+    if process.returncode:
+        raise RuntimeError(f'ffmpeg failed to write {output}')
+
+
+def _write_gif(frames, output, fps):
+    """Encode frames one at a time, each with own palette,
+    so only current frame is kept in memory"""
+    from PIL import Image, GifImagePlugin
+    with open(output, 'wb') as file:
+        for i, frame in enumerate(frames):
+            image = Image.fromarray(frame).convert('RGB').quantize()
+            if i == 0:
+                header, _ = GifImagePlugin.getheader(image, info={'loop': 0})
+                file.writelines(header)
+            file.writelines(GifImagePlugin.getdata(image, duration=1000 / fps,
+                                                   include_color_table=True))
+        file.write(b';')